@@ -0,0 +1,309 @@
+"""Move aged Slides/Markup/Controls items into the archive tree.
+
+Python port of bash/new-prod/dev-size-limit-update.sh. All candidate folders
+are measured by a single os.scandir walk instead of du/stat per item, moves
+are plain os.rename calls (falling back to copy+delete across filesystems),
+and the 500 GB budget is shared by every source rather than reset per loop.
+
+Rules kept from the shell version:
+  - folders whose name already exists in the archive are merged into it
+  - files whose name already exists get a -YYYYmmddHHMMSS suffix
+  - the job stops at the first item that would exceed the budget
+Markup and Controls live inside Slides but are never archived as Slides
+folders themselves. Name clashes met while merging a folder get the same
+timestamp rename as top-level files instead of being overwritten.
+"""
+import argparse
+import errno
+import logging
+import os
+import shutil
+import sys
+import time
+from datetime import datetime
+
+# Defaults match bash/new-prod/dev-size-limit-update.sh
+SLIDES_SRC = "./Images/Slides"
+ARCHIVE_ROOT = "./Images/Archive"
+DURATION = 90
+MAX_SIZE_GB = 500
+LOG_DIR = "/mnt/tank/scripts/logs/slides-logs"
+VOLUME = "/mnt/tank"
+
+GB = 1024 ** 3
+
+logger = logging.getLogger('archive')
+
+def setup_logging(log_dir):
+    """Log to archive_script-<date>.log in log_dir (as the shell job does) and to the console."""
+    os.makedirs(log_dir, exist_ok=True)
+    formatter = logging.Formatter('[%(asctime)s] %(message)s', datefmt='%Y-%m-%d_%H:%M:%S')
+    handlers = [
+        logging.FileHandler(os.path.join(log_dir, f"archive_script-{datetime.now().strftime('%Y-%m-%d')}.log")),
+        logging.StreamHandler()
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+def disk_usage(volume):
+    """Return 'X used, Y free' for the volume, like the df line in the shell job."""
+    try:
+        usage = shutil.disk_usage(volume)
+    except OSError as e:
+        return f"unavailable ({e.strerror})"
+    return f"{usage.used / GB:.1f}G used, {usage.free / GB:.1f}G free"
+
+def list_candidates(src, want_dirs, duration, now, exclude=()):
+    """Return direct children of src older than duration days, oldest first.
+
+    Matches `find src -mindepth 1 -maxdepth 1 -type d|f -mtime +duration`:
+    symlinks are not followed and ages are counted in whole days.
+    """
+    candidates = []
+    try:
+        with os.scandir(src) as it:
+            for entry in it:
+                if os.path.abspath(entry.path) in exclude:
+                    continue
+                if want_dirs:
+                    matches = entry.is_dir(follow_symlinks=False)
+                else:
+                    matches = entry.is_file(follow_symlinks=False)
+                if not matches:
+                    continue
+                st = entry.stat(follow_symlinks=False)
+                if (now - st.st_mtime) // 86400 > duration:
+                    candidates.append((st.st_mtime, entry.path, st))
+    except FileNotFoundError:
+        logger.info(f"WARNING: Source {src} does not exist")
+        return []
+    candidates.sort()
+    return [(path, st) for _, path, st in candidates]
+
+def allocated(st):
+    """Bytes allocated on disk for a stat result, as du counts them."""
+    blocks = getattr(st, 'st_blocks', None)
+    return blocks * 512 if blocks is not None else st.st_size
+
+def tree_usages(root, folders):
+    """Disk usage in bytes (du -d0) of each of folders under root, from one scandir walk.
+
+    The walk is iterative and post-order: a folder's total is added to its
+    parent's once its subtree is done, and only the totals of folders are
+    kept. Hard-linked files are counted once across the walk, as
+    `du -s a b` does.
+    """
+    root = os.path.abspath(root)
+    folders = {os.path.abspath(folder) for folder in folders}
+    usage = {root: allocated(os.lstat(root))}
+    found = {}
+    seen = set()
+    stack = [(root, None, False)]
+    while stack:
+        directory, parent, walked = stack.pop()
+        if walked:
+            total = usage.pop(directory)
+            if directory in folders:
+                found[directory] = total
+            if parent is not None:
+                usage[parent] += total
+            continue
+        stack.append((directory, parent, True))
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    st = entry.stat(follow_symlinks=False)
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    if st.st_nlink > 1 and not is_dir:
+                        if (st.st_dev, st.st_ino) in seen:
+                            continue
+                        seen.add((st.st_dev, st.st_ino))
+                    if is_dir:
+                        usage[entry.path] = allocated(st)
+                        stack.append((entry.path, directory, False))
+                    else:
+                        usage[directory] += allocated(st)
+        except OSError as e:
+            logger.info(f"WARNING: Could not read {directory}: {e.strerror}")
+    return found
+
+def conflict_path(dest_dir, name):
+    """Return a free name-YYYYmmddHHMMSS.ext path in dest_dir for a clashing name."""
+    base, ext = os.path.splitext(name)
+    stamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    candidate = os.path.join(dest_dir, f"{base}-{stamp}{ext}")
+    counter = 1
+    while os.path.lexists(candidate):
+        candidate = os.path.join(dest_dir, f"{base}-{stamp}-{counter}{ext}")
+        counter += 1
+    return candidate
+
+class Archiver:
+    """Moves items into the archive while keeping a running total against the budget."""
+
+    def __init__(self, max_size, dry_run=False):
+        self.max_size = max_size
+        self.dry_run = dry_run
+        self.total_moved = 0
+        self.limit_reached = False
+
+    def rename(self, src, dest):
+        """os.rename, falling back to copy+delete when src and dest are on different filesystems."""
+        if self.dry_run:
+            return
+        try:
+            os.rename(src, dest)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            shutil.move(src, dest)
+
+    def fits(self, name, size, unit, divisor):
+        if self.total_moved + size > self.max_size:
+            logger.info(f"SKIPPING: {name} (size: {size // divisor} {unit} - would exceed "
+                        f"{self.max_size // GB} GB limit)")
+            self.limit_reached = True
+            return False
+        return True
+
+    def merge(self, src, dest):
+        """Move the contents of src into the existing folder dest, recursing into shared subfolders."""
+        with os.scandir(src) as it:
+            entries = list(it)
+        for entry in entries:
+            target = os.path.join(dest, entry.name)
+            if entry.is_dir(follow_symlinks=False) and os.path.isdir(target) and not os.path.islink(target):
+                self.merge(entry.path, target)
+                if not self.dry_run:
+                    try:
+                        os.rmdir(entry.path)
+                    except OSError:
+                        pass
+                continue
+            if os.path.lexists(target):
+                target = conflict_path(dest, entry.name)
+                logger.info(f"RENAMED FILE: {entry.name} → {os.path.basename(target)} (conflict resolved)")
+            self.rename(entry.path, target)
+
+    def move_folder(self, src, dest_dir, size):
+        if self.limit_reached:
+            return
+        name = os.path.basename(src)
+        dest_path = os.path.join(dest_dir, name)
+        if not self.fits(name, size, 'MB', 1024 * 1024):
+            return
+
+        try:
+            if os.path.isdir(dest_path):
+                logger.info(f"MERGING: Moving contents of {name} to existing folder")
+                self.merge(src, dest_path)
+                if not self.dry_run:
+                    if not os.listdir(src):
+                        os.rmdir(src)
+                        logger.info(f"REMOVED: Empty source folder {name}")
+                    else:
+                        logger.info(f"WARNING: Could not remove {name} - not empty")
+            else:
+                self.rename(src, dest_path)
+                logger.info(f"MOVED FOLDER: {name} → {dest_dir}")
+        except OSError as e:
+            logger.info(f"ERROR: Could not move {name}: {e}")
+            return
+
+        self.total_moved += size
+        logger.info(f"MOVED: {name} ({size // (1024 * 1024)} MB) - Total: {self.total_moved // GB} GB")
+
+    def move_file(self, src, dest_dir, st):
+        if self.limit_reached:
+            return
+        name = os.path.basename(src)
+        size = st.st_size
+        if not self.fits(name, size, 'KB', 1024):
+            return
+
+        dest_path = os.path.join(dest_dir, name)
+        if os.path.lexists(dest_path):
+            dest_path = conflict_path(dest_dir, name)
+            logger.info(f"RENAMED FILE: {name} → {os.path.basename(dest_path)} (conflict resolved)")
+        try:
+            self.rename(src, dest_path)
+        except OSError as e:
+            logger.info(f"ERROR: Could not move {name}: {e}")
+            return
+        logger.info(f"MOVED FILE: {name} → {dest_path}")
+
+        self.total_moved += size
+        logger.info(f"MOVED: {name} ({size // 1024} KB) - Total: {self.total_moved // GB} GB")
+
+def main():
+    parser = argparse.ArgumentParser(description='Archive aged slide folders and files within a size budget')
+    parser.add_argument('--slides-src', default=SLIDES_SRC, help=f'Slides folder (default: {SLIDES_SRC})')
+    parser.add_argument('--archive', default=ARCHIVE_ROOT, help=f'Archive folder (default: {ARCHIVE_ROOT})')
+    parser.add_argument('--duration', type=int, default=DURATION,
+                        help=f'Archive items not modified for more than this many days (default: {DURATION})')
+    parser.add_argument('--max-size', type=int, default=MAX_SIZE_GB,
+                        help=f'Maximum GB to move per run (default: {MAX_SIZE_GB})')
+    parser.add_argument('--log-dir', default=LOG_DIR, help=f'Log directory (default: {LOG_DIR})')
+    parser.add_argument('--volume', default=VOLUME, help=f'Volume to report disk usage for (default: {VOLUME})')
+    parser.add_argument('--dry-run', action='store_true', help='Log what would be moved without moving it')
+    args = parser.parse_args()
+
+    setup_logging(args.log_dir)
+
+    markup_src = os.path.join(args.slides_src, 'Markup')
+    controls_src = os.path.join(args.slides_src, 'Controls')
+    markup_archive = os.path.join(args.archive, 'Markup')
+    controls_archive = os.path.join(args.archive, 'Controls')
+    nested = {os.path.abspath(markup_src), os.path.abspath(controls_src)}
+
+    # (source, archive, folders?, excluded paths), in the shell job's order
+    jobs = [
+        (args.slides_src, args.archive, True, nested),
+        (markup_src, markup_archive, True, ()),
+        (controls_src, controls_archive, True, ()),
+        (args.slides_src, args.archive, False, ()),
+        (markup_src, markup_archive, False, ()),
+    ]
+
+    if not args.dry_run:
+        for directory in (args.archive, markup_archive, controls_archive):
+            os.makedirs(directory, exist_ok=True)
+
+    archiver = Archiver(args.max_size * GB, args.dry_run)
+    logger.info(f"Starting archive job (Max: {args.max_size} GB){' - DRY RUN' if args.dry_run else ''}")
+    logger.info(f"Current disk usage: {disk_usage(args.volume)}")
+    started = time.monotonic()
+
+    now = time.time()
+    candidates = [list_candidates(src, folders, args.duration, now, exclude)
+                  for src, _, folders, exclude in jobs]
+    # Markup and Controls are inside Slides, so one walk sizes every candidate folder
+    folder_paths = [path for (_, _, folders, _), items in zip(jobs, candidates) if folders for path, _ in items]
+    sizes = tree_usages(args.slides_src, folder_paths) if folder_paths else {}
+    for (src, dest_dir, folders, exclude), items in zip(jobs, candidates):
+        if archiver.limit_reached:
+            break
+        for path, st in items:
+            if archiver.limit_reached:
+                break
+            if folders:
+                size = sizes.get(os.path.abspath(path))
+                if size is None:
+                    # A Markup or Controls symlinked out of Slides is not in the walk
+                    size = tree_usages(path, [path]).get(os.path.abspath(path), 0)
+                archiver.move_folder(path, dest_dir, size)
+            else:
+                archiver.move_file(path, dest_dir, st)
+
+    if archiver.limit_reached:
+        logger.info(f"Archive job PARTIALLY completed - {args.max_size} GB limit reached")
+    else:
+        logger.info("Archive job FULLY completed")
+    logger.info(f"Total data moved: {archiver.total_moved // GB} GB in {time.monotonic() - started:.0f}s")
+    logger.info(f"Current disk usage: {disk_usage(args.volume)}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""Upload the archive tree to S3 (DEEP_ARCHIVE by default) with small files bundled.
+
+Files at or above --bundle-threshold go up as individual objects under
+<prefix><relative path>. Smaller files are packed, in path order, into
+uncompressed tar bundles of about --bundle-size under <prefix>_bundles/<run>/,
+so millions of markup/control files become a few thousand objects to pay
+for and, later, to restore.
+
+Every uploaded file gets a row in a member index (path, key, offset,
+length, size, mtime). For a bundled file offset/length locate its bytes
+inside the tar, so a restored bundle can be read with a ranged GET. The
+index is kept locally in --index-dir, which lets the next run skip files
+that are unchanged, and uploaded to <prefix>_index/<run>.csv.gz in STANDARD
+so it can be read without a restore.
+"""
+import boto3
+import argparse
+import csv
+import gzip
+import logging
+import os
+import sys
+import tarfile
+import tempfile
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+TAR_BLOCK = 512
+INDEX_FIELDS = ('path', 'key', 'offset', 'length', 'size', 'mtime')
+
+def iter_files(root):
+    """Yield (relative_path, path, size, mtime) for every regular file under root, in path order.
+
+    Directories are read once each with os.scandir and visited depth first,
+    so files of one case folder come out together and end up in the same bundles.
+    """
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            logger.error(f"Could not read {directory}: {e.strerror}")
+            continue
+        subdirs = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                st = entry.stat(follow_symlinks=False)
+                rel = os.path.relpath(entry.path, root).replace(os.sep, '/')
+                yield rel, entry.path, st.st_size, int(st.st_mtime)
+        stack.extend(reversed(subdirs))
+
+def load_index(index_dir):
+    """Return {path: (size, mtime)} for everything recorded by earlier runs.
+
+    The index of a run that was killed ends in a truncated gzip stream; the
+    rows before the cut are kept, and a cut-off last row is dropped or no
+    longer matches its file, which is then uploaded again.
+    """
+    uploaded = {}
+    if not os.path.isdir(index_dir):
+        return uploaded
+    for name in sorted(os.listdir(index_dir)):
+        if not name.endswith('.csv.gz'):
+            continue
+        try:
+            with gzip.open(os.path.join(index_dir, name), 'rt', newline='') as f:
+                for row in csv.DictReader(f):
+                    if row['mtime']:
+                        uploaded[row['path']] = (int(row['size']), int(row['mtime']))
+        except (EOFError, gzip.BadGzipFile, zlib.error) as e:
+            logger.warning(f"Index {name} is incomplete, using the rows before the damage: {str(e)}")
+    return uploaded
+
+def plan_uploads(files, bundle_threshold, bundle_size):
+    """Group files into ('file', [file]) and ('bundle', [files...]) uploads."""
+    bundle, bundle_bytes = [], 0
+    for item in files:
+        size = item[2]
+        if size >= bundle_threshold:
+            yield 'file', [item]
+            continue
+        bundle.append(item)
+        bundle_bytes += TAR_BLOCK + -(-size // TAR_BLOCK) * TAR_BLOCK
+        if bundle_bytes >= bundle_size:
+            yield 'bundle', bundle
+            bundle, bundle_bytes = [], 0
+    if bundle:
+        yield 'bundle', bundle
+
+def build_bundle(files, tar_path):
+    """Write files into an uncompressed tar and return index rows for the members written.
+
+    The data of each member starts right after its header and is padded to
+    the tar block size, so its offset is the archive position after the
+    member minus the padded length. A member holds the size and mtime of the
+    open file: a file that grows while being read is stored as it was when
+    opened, and its index row carries that size and mtime, so the next run
+    uploads it again. A file that cannot be opened, or shrinks so the read
+    comes up short, is logged and cut back out of the archive.
+    """
+    members = []
+    with tarfile.open(tar_path, 'w', format=tarfile.PAX_FORMAT) as tar:
+        for rel, path, _, _ in files:
+            start = tar.offset
+            try:
+                with open(path, 'rb') as f:
+                    # fstat of the open file, so the header and the bytes copied agree
+                    info = tar.gettarinfo(arcname=rel, fileobj=f)
+                    tar.addfile(info, f)
+            except OSError as e:
+                logger.error(f"  Skipping {rel}: {str(e)}")
+                # Drop the header and any data already written for the member
+                tar.fileobj.seek(start)
+                tar.fileobj.truncate()
+                tar.offset = start
+                continue
+            offset = tar.offset - -(-info.size // TAR_BLOCK) * TAR_BLOCK
+            members.append((rel, offset, info.size, info.size, int(info.mtime)))
+    return members
+
+def upload_file(s3, path, bucket, key, storage_class, transfer_config):
+    s3.upload_file(path, bucket, key, ExtraArgs={'StorageClass': storage_class}, Config=transfer_config)
+
+def run_upload(s3, kind, files, seq, args, transfer_config):
+    """Upload one planned item and return its index rows."""
+    if kind == 'file':
+        rel, path, size, mtime = files[0]
+        key = f"{args.prefix}{rel}"
+        upload_file(s3, path, args.bucket, key, args.storage_class, transfer_config)
+        return [(rel, key, 0, size, size, mtime)]
+
+    key = f"{args.prefix}_bundles/{args.run_id}/bundle-{seq:06d}.tar"
+    fd, tar_path = tempfile.mkstemp(suffix='.tar', dir=args.staging_dir)
+    os.close(fd)
+    try:
+        members = build_bundle(files, tar_path)
+        if not members:
+            return []
+        upload_file(s3, tar_path, args.bucket, key, args.storage_class, transfer_config)
+    finally:
+        os.unlink(tar_path)
+    return [(rel, key, offset, length, size, mtime) for rel, offset, length, size, mtime in members]
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(),
+            logging.FileHandler('archive_upload.log')
+        ]
+    )
+
+    parser = argparse.ArgumentParser(description='Upload the archive tree to S3 with small files bundled into tars')
+    parser.add_argument('--source', required=True, help='Archive folder to upload (e.g. ./Images/Archive)')
+    parser.add_argument('--bucket', required=True, help='S3 bucket name')
+    parser.add_argument('--prefix', default='', help='Key prefix for uploaded objects')
+    parser.add_argument('--storage-class', default='DEEP_ARCHIVE', help='Storage class (default: DEEP_ARCHIVE)')
+    parser.add_argument('--bundle-threshold', type=int, default=64,
+                        help='Files smaller than this many MB are bundled (default: 64)')
+    parser.add_argument('--bundle-size', type=int, default=1024, help='Target bundle size in MB (default: 1024)')
+    parser.add_argument('--workers', type=int, default=4, help='Uploads in flight at once (default: 4)')
+    parser.add_argument('--transfer-threads', type=int, default=8,
+                        help='Concurrent part uploads per object (default: 8)')
+    parser.add_argument('--part-size', type=int, default=64, help='Multipart part size in MB (default: 64)')
+    parser.add_argument('--staging-dir', default=tempfile.gettempdir(),
+                        help='Where bundles are built before upload (default: system temp dir)')
+    parser.add_argument('--index-dir', default='./archive-index',
+                        help='Local member index; files recorded here and unchanged are skipped (default: ./archive-index)')
+    parser.add_argument('--profile', help='AWS profile name')
+    parser.add_argument('--endpoint-url', help='Custom S3 endpoint URL')
+    args = parser.parse_args()
+
+    for name in ('bundle_threshold', 'bundle_size', 'workers', 'transfer_threads', 'part_size'):
+        if getattr(args, name) < 1:
+            logger.error(f"--{name.replace('_', '-')} must be at least 1")
+            sys.exit(1)
+    if args.prefix and not args.prefix.endswith('/'):
+        args.prefix += '/'
+    args.run_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+    session = boto3.Session(profile_name=args.profile)
+    s3 = session.client('s3', endpoint_url=args.endpoint_url, config=Config(
+        max_pool_connections=args.workers * args.transfer_threads
+    ))
+    transfer_config = TransferConfig(
+        multipart_threshold=args.part_size * MB,
+        multipart_chunksize=args.part_size * MB,
+        max_concurrency=args.transfer_threads
+    )
+
+    os.makedirs(args.index_dir, exist_ok=True)
+    uploaded = load_index(args.index_dir)
+    skipped = 0
+
+    def changed_files():
+        nonlocal skipped
+        for item in iter_files(args.source):
+            if uploaded.get(item[0]) == (item[2], item[3]):
+                skipped += 1
+                continue
+            yield item
+
+    index_name = f"{args.run_id}.csv.gz"
+    index_path = os.path.join(args.index_dir, index_name)
+    stats = {'objects': 0, 'files': 0, 'bytes': 0, 'errors': 0}
+    started = time.monotonic()
+    logger.info(f"Uploading {args.source} to s3://{args.bucket}/{args.prefix} ({args.storage_class})")
+
+    with gzip.open(index_path, 'wt', newline='') as index_file, \
+            ThreadPoolExecutor(max_workers=args.workers) as executor:
+        writer = csv.writer(index_file)
+        writer.writerow(INDEX_FIELDS)
+        in_flight = {}
+
+        def collect(done):
+            for future in done:
+                kind, files = in_flight.pop(future)
+                try:
+                    rows = future.result()
+                except Exception as e:
+                    stats['errors'] += 1
+                    logger.error(f"  Upload failed for {kind} starting at {files[0][0]}: {str(e)}")
+                    continue
+                writer.writerows(rows)
+                if rows:
+                    stats['objects'] += 1
+                    stats['files'] += len(rows)
+                    stats['bytes'] += sum(row[4] for row in rows)
+                    logger.info(f"  Uploaded {rows[0][1]} ({len(rows)} files)")
+
+        for seq, (kind, files) in enumerate(plan_uploads(changed_files(), args.bundle_threshold * MB,
+                                                         args.bundle_size * MB)):
+            # Bound the work queued ahead of the uploads, and the bundles staged on disk
+            while len(in_flight) >= args.workers * 2:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight[executor.submit(run_upload, s3, kind, files, seq, args, transfer_config)] = (kind, files)
+        collect(wait(in_flight).done)
+
+    if stats['files']:
+        s3.upload_file(index_path, args.bucket, f"{args.prefix}_index/{index_name}")
+    else:
+        os.unlink(index_path)
+
+    logger.info(f"Uploaded {stats['files']} files ({stats['bytes']/1024/1024:.2f} MB) as {stats['objects']} objects "
+                f"in {time.monotonic() - started:.0f}s; {skipped} unchanged files skipped, "
+                f"{stats['errors']} failed uploads")
+    sys.exit(1 if stats['errors'] else 0)
+
+if __name__ == '__main__':
+    main()
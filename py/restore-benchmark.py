@@ -0,0 +1,604 @@
+"""Benchmark the backup-noteify2.py pipeline against an in-process S3 stand-in.
+
+The stand-in keeps synthetic GLACIER/DEEP_ARCHIVE objects in memory and
+answers the subset of the S3 API the restore tool uses. Restores complete on
+a virtual clock: each one finishes at a random point of its tier's typical
+window (RESTORE_WINDOWS in the tool), and the polling benchmark jumps the
+clock straight to the next due check, so days of Bulk restores simulate in
+seconds. Every request can be given latency, random 500s and a per-operation
+request rate above which it answers SlowDown.
+
+The tool is loaded with importlib and its own functions are timed, so the
+same harness measures any version of it:
+
+  list      ListObjectsV2 through iter_prefix_keys()
+  scan      HEAD + RestoreObject per key through check_and_restore()
+  restore   RestoreObject only, as for inventory keys, through restore_listed_object()
+  batch     listing plus one S3 Batch Operations job per tier through start_batch_restores()
+  poll      RestoreScheduler + head_keys() until every restore is seen (adaptive and fixed)
+  download  transfer_object() into a staging directory
+  copy      CopyStage from the staging directory to a share directory
+
+Results are written as JSON together with the parameters and a hash of the
+tool, so runs of different versions can be compared.
+"""
+import argparse
+import bisect
+import csv
+import hashlib
+import importlib.util
+import io
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from urllib.parse import unquote_plus
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger('restore-benchmark')
+
+TOOL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backup-noteify2.py')
+BENCHMARKS = ('list', 'scan', 'restore', 'batch', 'poll', 'download', 'copy')
+BUCKET = 'benchmark'
+LIST_PAGE_SIZE = 1000
+ZERO_CHUNK = bytes(1024 * 1024)
+
+API_NAMES = {
+    'list_objects_v2': 'ListObjectsV2',
+    'head_object': 'HeadObject',
+    'restore_object': 'RestoreObject',
+    'get_object': 'GetObject',
+    'put_object': 'PutObject',
+}
+
+def load_tool(path):
+    """Import the restore tool from its file; the hyphenated name rules out a normal import."""
+    spec = importlib.util.spec_from_file_location('backup_noteify2', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def client_error(code, status, operation):
+    return ClientError({'Error': {'Code': code, 'Message': code},
+                        'ResponseMetadata': {'HTTPStatusCode': status}}, operation)
+
+class VirtualClock:
+    """Seconds since the start of a benchmark, running speedup times faster than real time.
+
+    set() pins the clock to a point in simulated time, which is how the
+    polling benchmark skips the waits between checks.
+    """
+
+    def __init__(self, speedup):
+        self.speedup = speedup
+        self.reset()
+
+    def reset(self):
+        self.started = time.monotonic()
+        self.pinned = None
+
+    def set(self, now):
+        self.pinned = now
+
+    def now(self):
+        if self.pinned is not None:
+            return self.pinned
+        return (time.monotonic() - self.started) * self.speedup
+
+class StubBody:
+    """Minimal StreamingBody returning size zero bytes."""
+
+    def __init__(self, size):
+        self.remaining = size
+
+    def read(self, amt=None):
+        amt = self.remaining if amt is None else min(amt, self.remaining)
+        self.remaining -= amt
+        return ZERO_CHUNK[:amt] if amt <= len(ZERO_CHUNK) else bytes(amt)
+
+    def iter_chunks(self, chunk_size=1024 * 1024):
+        while chunk := self.read(chunk_size):
+            yield chunk
+
+    def close(self):
+        pass
+
+class StubS3:
+    """Thread-safe in-memory S3 with restores that complete on a VirtualClock.
+
+    Objects are [storage_class, size, etag, tier, ready_at]; ready_at is
+    None until a restore is requested. Object bodies are zeros, so ETags are
+    the MD5 of size zero bytes and downloads can be verified.
+    """
+
+    def __init__(self, tool, keys, sizes, classes, clock, latency=0.0, error_rate=0.0, throttle_rate=0.0):
+        self.tool = tool
+        self.keys = keys
+        self.clock = clock
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.last_modified = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        etags = {size: hashlib.md5(bytes(size)).hexdigest() for size in set(sizes)}
+        self.objects = {key: [sc, size, etags[size], None, None] for key, size, sc in zip(keys, sizes, classes)}
+        # Manifests and reports written through put_object, kept apart from the archived objects
+        self.files = {}
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.throttled = Counter()
+        self.buckets = {}
+        self.meta = SimpleNamespace(method_to_api_mapping=API_NAMES)
+
+    def reset_restores(self):
+        with self.lock:
+            for obj in self.objects.values():
+                obj[3] = obj[4] = None
+            self.files.clear()
+
+    def restore_all(self):
+        """Mark every object restored, for the download and copy benchmarks."""
+        with self.lock:
+            for obj in self.objects.values():
+                obj[3], obj[4] = 'Standard', float('-inf')
+
+    def reset_counters(self):
+        with self.lock:
+            self.calls.clear()
+            self.throttled.clear()
+
+    def _request(self, operation):
+        """Apply the injected throttling, errors and latency to one request."""
+        with self.lock:
+            self.calls[operation] += 1
+            if self.throttle_rate:
+                # Token bucket per operation; an empty bucket answers SlowDown
+                now = time.monotonic()
+                tokens, updated = self.buckets.get(operation, (self.throttle_rate, now))
+                tokens = min(self.throttle_rate, tokens + (now - updated) * self.throttle_rate)
+                if tokens < 1:
+                    self.buckets[operation] = (tokens, now)
+                    self.throttled[operation] += 1
+                    raise client_error('SlowDown', 503, operation)
+                self.buckets[operation] = (tokens - 1, now)
+        if self.latency:
+            time.sleep(self.latency * random.uniform(0.5, 1.5))
+        if self.error_rate and random.random() < self.error_rate:
+            raise client_error('InternalError', 500, operation)
+
+    def _object(self, key, operation):
+        obj = self.objects.get(key)
+        if obj is None:
+            raise client_error('NoSuchKey' if operation != 'HeadObject' else '404', 404, operation)
+        return obj
+
+    def _restored(self, obj):
+        return obj[4] is not None and obj[4] <= self.clock.now()
+
+    def list_objects_v2(self, Bucket, Prefix='', ContinuationToken=None, MaxKeys=LIST_PAGE_SIZE,
+                        OptionalObjectAttributes=(), **kwargs):
+        self._request('ListObjectsV2')
+        start = bisect.bisect_right(self.keys, ContinuationToken) if ContinuationToken else \
+            bisect.bisect_left(self.keys, Prefix)
+        page = []
+        for key in self.keys[start:start + MaxKeys]:
+            if not key.startswith(Prefix):
+                break
+            sc, size, etag, _, ready_at = self.objects[key]
+            entry = {'Key': key, 'Size': size, 'ETag': f'"{etag}"', 'StorageClass': sc,
+                     'LastModified': self.last_modified}
+            if 'RestoreStatus' in OptionalObjectAttributes and ready_at is not None:
+                entry['RestoreStatus'] = {'IsRestoreInProgress': ready_at > self.clock.now()}
+                if ready_at <= self.clock.now():
+                    entry['RestoreStatus']['RestoreExpiryDate'] = datetime.now(timezone.utc) + timedelta(days=7)
+            page.append(entry)
+        response = {'Contents': page, 'KeyCount': len(page),
+                    'IsTruncated': len(page) == MaxKeys and start + MaxKeys < len(self.keys)}
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = page[-1]['Key']
+        return response
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._request('HeadObject')
+        sc, size, etag, _, ready_at = self._object(Key, 'HeadObject')
+        head = {'ContentLength': size, 'ETag': f'"{etag}"', 'StorageClass': sc,
+                'LastModified': self.last_modified, 'ResponseMetadata': {'HTTPStatusCode': 200}}
+        if ready_at is not None:
+            if ready_at > self.clock.now():
+                head['Restore'] = 'ongoing-request="true"'
+            else:
+                expiry = datetime.now(timezone.utc) + timedelta(days=7)
+                head['Restore'] = f'ongoing-request="false", expiry-date="{expiry:%a, %d %b %Y %H:%M:%S GMT}"'
+        return head
+
+    def start_restore(self, key, tier):
+        """Request a restore without going through the injected faults; returns the HTTP status."""
+        obj = self._object(key, 'RestoreObject')
+        with self.lock:
+            if obj[4] is not None:
+                if obj[4] > self.clock.now():
+                    raise client_error('RestoreAlreadyInProgress', 409, 'RestoreObject')
+                return 200
+            lo, hi = self.tool.RESTORE_WINDOWS[(obj[0], tier)]
+            obj[3], obj[4] = tier, self.clock.now() + random.uniform(lo, hi) * 3600
+        return 202
+
+    def restore_object(self, Bucket, Key, RestoreRequest, **kwargs):
+        self._request('RestoreObject')
+        status = self.start_restore(Key, RestoreRequest['GlacierJobParameters']['Tier'])
+        return {'ResponseMetadata': {'HTTPStatusCode': status}}
+
+    def _readable(self, key, operation):
+        obj = self._object(key, operation)
+        if not self._restored(obj):
+            raise client_error('InvalidObjectState', 403, operation)
+        return obj
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._request('PutObject')
+        self.files[Key] = bytes(Body)
+        return {'ETag': f'"{hashlib.md5(Body).hexdigest()}"', 'ResponseMetadata': {'HTTPStatusCode': 200}}
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        self._request('GetObject')
+        if Key in self.files:
+            return {'Body': io.BytesIO(self.files[Key]), 'ResponseMetadata': {'HTTPStatusCode': 200}}
+        size = self._readable(Key, 'GetObject')[1]
+        if Range:
+            start, end = (int(v) for v in Range.split('=')[1].split('-'))
+            size = min(end, size - 1) - start + 1
+        return {'Body': StubBody(size), 'ContentLength': size, 'ResponseMetadata': {'HTTPStatusCode': 200}}
+
+    def download_file(self, Bucket, Key, Filename, Config=None, **kwargs):
+        self._request('GetObject')
+        size = self._readable(Key, 'GetObject')[1]
+        with open(Filename, 'wb') as f:
+            for chunk in StubBody(size).iter_chunks():
+                f.write(chunk)
+
+class StubS3Control:
+    """S3 Batch Operations stand-in running S3InitiateRestoreObject jobs against a StubS3.
+
+    A job's tasks all run when it is created, so the first describe_job
+    already reports it Complete, with a failed-tasks report written back to
+    the stand-in the way S3 lays one out.
+    """
+
+    def __init__(self, stub):
+        self.stub = stub
+        self.jobs = {}
+        self.calls = Counter()
+
+    def create_job(self, AccountId, Operation, Manifest, Report, **kwargs):
+        self.calls['CreateJob'] += 1
+        job_id = f"job-{len(self.jobs) + 1:04d}"
+        tier = Operation['S3InitiateRestoreObject']['GlacierJobTier'].capitalize()
+        manifest_key = Manifest['Location']['ObjectArn'].split('/', 1)[1]
+        rows = list(csv.reader(io.StringIO(self.stub.files[manifest_key].decode())))
+        failed = []
+        for bucket, key in rows:
+            try:
+                self.stub.start_restore(unquote_plus(key), tier)
+            except ClientError as e:
+                code = e.response['Error']['Code']
+                failed.append((bucket, key, '', 'failed', code, e.response['ResponseMetadata']['HTTPStatusCode'], code))
+
+        report_bucket = Report['Bucket'].split(':::', 1)[1]
+        results = []
+        if failed:
+            out = io.StringIO()
+            csv.writer(out).writerows(failed)
+            results_key = f"{Report['Prefix']}/job-{job_id}/results/failed.csv"
+            self.stub.files[results_key] = out.getvalue().encode()
+            results.append({'TaskExecutionStatus': 'failed', 'Bucket': report_bucket, 'Key': results_key})
+        self.stub.files[f"{Report['Prefix']}/job-{job_id}/manifest.json"] = json.dumps({'Results': results}).encode()
+        self.jobs[job_id] = {
+            'JobId': job_id,
+            'Status': 'Complete',
+            'Report': Report,
+            'ProgressSummary': {'TotalNumberOfTasks': len(rows), 'NumberOfTasksSucceeded': len(rows) - len(failed),
+                                'NumberOfTasksFailed': len(failed)},
+        }
+        return {'JobId': job_id}
+
+    def describe_job(self, AccountId, JobId):
+        self.calls['DescribeJob'] += 1
+        return {'Job': self.jobs[JobId]}
+
+def build_stub(tool, args, clock):
+    """Lay out args.objects keys over args.prefixes folders with a seeded class and size mix."""
+    rng = random.Random(args.seed)
+    width = len(str(args.objects))
+    keys = sorted(f"bench/{i % args.prefixes:04d}/object-{i:0{width}d}.dat" for i in range(args.objects))
+    classes = ['DEEP_ARCHIVE' if rng.random() < args.deep_archive_fraction else 'GLACIER' for _ in keys]
+    sizes = [args.object_size * 1024] * len(keys)
+    return StubS3(tool, keys, sizes, classes, clock, args.latency_ms / 1000, args.error_rate, args.throttle_rate)
+
+def result(seconds, operations, stub, **extra):
+    return {
+        'seconds': round(seconds, 4),
+        'operations': operations,
+        'operations_per_sec': round(operations / seconds, 1) if seconds else None,
+        'requests': dict(stub.calls),
+        'throttled': dict(stub.throttled),
+        **extra
+    }
+
+def bench_list(tool, stub, client, args):
+    started = time.perf_counter()
+    count = sum(1 for _ in tool.iter_prefix_keys(client, BUCKET, 'bench/'))
+    return result(time.perf_counter() - started, count, stub)
+
+def bench_scan(tool, stub, client, args):
+    keys = stub.keys[:args.scan_objects]
+    statuses = Counter()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        check = lambda key: tool.check_and_restore(client, BUCKET, key, 1)
+        for key, future in tool.bounded_map(executor, check, keys, args.concurrency * 4):
+            try:
+                statuses[future.result().status] += 1
+            except Exception:
+                statuses['error'] += 1
+    return result(time.perf_counter() - started, len(keys), stub, statuses=dict(statuses))
+
+def bench_restore(tool, stub, client, args):
+    keys = stub.keys[:args.scan_objects]
+    statuses = Counter()
+
+    def restore(key):
+        sc, size, etag, _, _ = stub.objects[key]
+        return tool.restore_listed_object(client, BUCKET, key, sc, size, etag, stub.last_modified, 1)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for key, future in tool.bounded_map(executor, restore, keys, args.concurrency * 4):
+            try:
+                statuses[future.result().status] += 1
+            except Exception:
+                statuses['error'] += 1
+    return result(time.perf_counter() - started, len(keys), stub, statuses=dict(statuses))
+
+def bench_batch(tool, stub, client, args):
+    """What --batch-ops does for a prefix: classify keys from one listing, then restore them in batch jobs."""
+    control = StubS3Control(stub)
+    job_args = SimpleNamespace(bucket=BUCKET, job_name='benchmark', restore_days=1, timeout=1,
+                               batch_ops_location=f"s3://{BUCKET}/batch/", batch_ops_account='000000000000',
+                               batch_ops_role='arn:aws:iam::000000000000:role/benchmark')
+    journal = SimpleNamespace(record_status=lambda *a, **kw: None, commit=lambda: None)
+    status_map = {}
+    restores = {}
+    started = time.perf_counter()
+    listing = tool.iter_prefix_objects(client, BUCKET, 'bench/', OptionalObjectAttributes=['RestoreStatus'])
+    for obj in itertools.islice(listing, args.scan_objects):
+        scan = tool.listed_scan_result(obj['Key'], obj['StorageClass'], obj['Size'], obj['ETag'].strip('"'),
+                                       obj['LastModified'], obj.get('RestoreStatus'))
+        status_map[scan.key] = scan.status
+        restores[scan.key] = (scan.storage_class, tool.default_tier(scan.storage_class), None)
+    tool.start_batch_restores(client, control, job_args, status_map, restores, journal)
+    return result(time.perf_counter() - started, len(status_map), stub, statuses=dict(Counter(status_map.values())),
+                  control_requests=dict(control.calls))
+
+def bench_poll(tool, stub, client, args, schedule):
+    """Poll freshly requested restores to completion on the virtual clock.
+
+    Reports HEADs per key and the detection lag: simulated time between a
+    restore finishing and the check that saw it.
+    """
+    keys = stub.keys[:args.poll_objects]
+    stub.clock.set(0.0)
+    for key in keys:
+        stub.start_restore(key, tool.default_tier(stub.objects[key][0]))
+
+    scheduler = tool.RestoreScheduler(args.min_check_interval * 60, args.check_interval * 60,
+                                      adaptive=schedule == 'adaptive')
+    for key in keys:
+        sc, _, _, tier, _ = stub.objects[key]
+        scheduler.add(key, sc, tier, started=0.0, now=0.0)
+    pending = set(keys)
+    lags = []
+    checks = 0
+    started = time.perf_counter()
+    while pending:
+        now = scheduler.next_due()
+        stub.clock.set(now)
+        due = scheduler.pop_due(now)
+        checks += 1
+        for key, head, error in tool.head_keys(client, BUCKET, due, args.concurrency):
+            if not error and tool.get_restore_status(head) == 'restored':
+                lags.append(now - stub.objects[key][4])
+                pending.discard(key)
+                scheduler.discard(key)
+            else:
+                scheduler.reschedule(key, now)
+    seconds = time.perf_counter() - started
+    heads = stub.calls['HeadObject']
+    return result(seconds, len(keys), stub, schedule=schedule, check_rounds=checks,
+                  heads_per_key=round(heads / len(keys), 2),
+                  simulated_hours=round(stub.clock.now() / 3600, 2),
+                  detection_lag_minutes={
+                      'mean': round(statistics.mean(lags) / 60, 1),
+                      'p95': round((statistics.quantiles(lags, n=20)[-1] if len(lags) > 1 else lags[0]) / 60, 1),
+                      'max': round(max(lags) / 60, 1),
+                  })
+
+def bench_download(tool, stub, client, args, download_dir, network_share):
+    keys = stub.keys[:args.download_objects]
+    transfer_config = tool.create_transfer_config(args.multipart_chunksize, args.multipart_threshold,
+                                                  args.transfer_threads)
+    errors = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.download_workers) as executor:
+        futures = [executor.submit(tool.transfer_object, client, BUCKET, key, download_dir, network_share,
+                                   transfer_config, None, None, stub.objects[key][1]) for key in keys]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                errors += 1
+                logger.error(f"Download failed: {str(e)}")
+    seconds = time.perf_counter() - started
+    total = sum(stub.objects[key][1] for key in keys)
+    return result(seconds, len(keys), stub, errors=errors, bytes=total,
+                  mb_per_sec=round(total / 1024 / 1024 / seconds, 1) if seconds else None)
+
+def bench_copy(tool, stub, args, download_dir, network_share):
+    keys = [key for key in stub.keys[:args.download_objects] if os.path.exists(os.path.join(download_dir, key))]
+    copier = tool.CopyStage(download_dir, network_share, args.copy_workers, args.copy_per_dir)
+    errors = 0
+    started = time.perf_counter()
+    copier.prepare(keys)
+    for key in keys:
+        copier.submit(key)
+    for _, _, error in copier.drain(wait=True):
+        errors += bool(error)
+    copier.close()
+    seconds = time.perf_counter() - started
+    total = sum(stub.objects[key][1] for key in keys)
+    return result(seconds, len(keys), stub, errors=errors, bytes=total,
+                  mb_per_sec=round(total / 1024 / 1024 / seconds, 1) if seconds else None)
+
+def run_benchmarks(tool, args):
+    clock = VirtualClock(args.speedup)
+    logger.info(f"Building stand-in with {args.objects} objects")
+    stub = build_stub(tool, args, clock)
+    governor = tool.RequestGovernor(args.max_request_rate, max_attempts=args.max_attempts)
+    client = tool.GovernedClient(stub, governor)
+    work_dir = tempfile.mkdtemp(prefix='restore-bench-', dir=args.work_dir)
+    download_dir = os.path.join(work_dir, 'download')
+    network_share = os.path.join(work_dir, 'share')
+    results = {}
+
+    def timed(name, fn, *fn_args, setup=None):
+        runs = []
+        for _ in range(args.repeat):
+            if setup:
+                setup()
+            stub.reset_counters()
+            clock.reset()
+            runs.append(fn(*fn_args))
+        best = min(runs, key=lambda r: r['seconds'])
+        best['runs_seconds'] = [r['seconds'] for r in runs]
+        results[name] = best
+        logger.info(f"{name:<16} {best['seconds']:>9.3f}s  {best['operations_per_sec'] or 0:>10.1f} ops/s"
+                    + (f"  {best['mb_per_sec']} MB/s" if 'mb_per_sec' in best else ''))
+
+    def reset_polls():
+        random.seed(args.seed)
+        stub.reset_restores()
+
+    try:
+        if 'list' in args.bench:
+            timed('list', bench_list, tool, stub, client, args)
+        if 'scan' in args.bench:
+            timed('scan', bench_scan, tool, stub, client, args, setup=stub.reset_restores)
+        if 'restore' in args.bench:
+            timed('restore', bench_restore, tool, stub, client, args, setup=stub.reset_restores)
+        if 'batch' in args.bench:
+            timed('batch', bench_batch, tool, stub, client, args, setup=stub.reset_restores)
+        if 'poll' in args.bench:
+            for schedule in ('adaptive', 'fixed'):
+                timed(f"poll_{schedule}", bench_poll, tool, stub, client, args, schedule, setup=reset_polls)
+
+        # Downloads use the bare stand-in: the tool's transfer client is only attach()ed to the governor
+        stub.restore_all()
+        clear_downloads = lambda: shutil.rmtree(download_dir, ignore_errors=True)
+        clear_share = lambda: shutil.rmtree(network_share, ignore_errors=True)
+        if 'download' in args.bench or 'copy' in args.bench:
+            timed('download', bench_download, tool, stub, stub, args, download_dir, None, setup=clear_downloads)
+        if 'download' in args.bench:
+            timed('stream', bench_download, tool, stub, stub, args, None, network_share, setup=clear_share)
+        if 'copy' in args.bench:
+            timed('copy', bench_copy, tool, stub, args, download_dir, network_share, setup=clear_share)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark backup-noteify2.py against an in-process S3 stand-in')
+    parser.add_argument('--tool', default=TOOL_PATH, help='Restore tool to benchmark (default: backup-noteify2.py beside this script)')
+    parser.add_argument('--bench', default=','.join(BENCHMARKS),
+                        help=f"Comma-separated benchmarks to run (default: {','.join(BENCHMARKS)})")
+    parser.add_argument('--objects', type=int, default=10000, help='Synthetic objects in the stand-in (default: 10000)')
+    parser.add_argument('--prefixes', type=int, default=100, help='Folders the objects are spread over (default: 100)')
+    parser.add_argument('--deep-archive-fraction', type=float, default=0.5,
+                        help='Share of objects in DEEP_ARCHIVE, the rest GLACIER (default: 0.5)')
+    parser.add_argument('--object-size', type=int, default=256, help='Object size in KB (default: 256)')
+    parser.add_argument('--scan-objects', type=int, default=2000,
+                        help='Keys used by scan, restore and batch (default: 2000)')
+    parser.add_argument('--poll-objects', type=int, default=500, help='Restores polled to completion (default: 500)')
+    parser.add_argument('--download-objects', type=int, default=200,
+                        help='Objects used by download and copy (default: 200)')
+    parser.add_argument('--latency-ms', type=float, default=5, help='Mean injected latency per request (default: 5)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests failing with 500 (default: 0)')
+    parser.add_argument('--throttle-rate', type=float, default=0,
+                        help='Requests/sec per operation above which the stand-in answers SlowDown (default: off)')
+    parser.add_argument('--speedup', type=float, default=3600,
+                        help='Simulated seconds per real second for restore completion (default: 3600)')
+    parser.add_argument('--concurrency', type=int, default=16, help='Workers for scan, restore and poll (default: 16)')
+    parser.add_argument('--max-request-rate', type=float, default=3500, help='Governor request rate (default: 3500)')
+    parser.add_argument('--max-attempts', type=int, default=8, help='Governor attempts per request (default: 8)')
+    parser.add_argument('--check-interval', type=int, default=60, help='Poll --check-interval in minutes (default: 60)')
+    parser.add_argument('--min-check-interval', type=int, default=10,
+                        help='Poll --min-check-interval in minutes (default: 10)')
+    parser.add_argument('--download-workers', type=int, default=4, help='Concurrent downloads (default: 4)')
+    parser.add_argument('--transfer-threads', type=int, default=8, help='Threads per download (default: 8)')
+    parser.add_argument('--multipart-chunksize', type=int, default=64, help='Multipart chunk size in MB (default: 64)')
+    parser.add_argument('--multipart-threshold', type=int, default=64, help='Multipart threshold in MB (default: 64)')
+    parser.add_argument('--copy-workers', type=int, default=16, help='Concurrent share copies (default: 16)')
+    parser.add_argument('--copy-per-dir', type=int, default=4, help='Copies per destination folder (default: 4)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per benchmark; the fastest is reported (default: 3)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for the object mix and restore times (default: 1)')
+    parser.add_argument('--work-dir', help='Where download and share directories are created (default: system temp dir)')
+    parser.add_argument('--output', help='JSON results file (default: restore-benchmark-<timestamp>.json)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    args.bench = [name.strip() for name in args.bench.split(',') if name.strip()]
+    unknown = set(args.bench) - set(BENCHMARKS)
+    if unknown:
+        logger.error(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+        sys.exit(1)
+    for name in ('objects', 'prefixes', 'object_size', 'scan_objects', 'poll_objects', 'download_objects',
+                 'concurrency', 'download_workers', 'transfer_threads', 'copy_workers', 'copy_per_dir', 'repeat'):
+        if getattr(args, name) < 1:
+            logger.error(f"--{name.replace('_', '-')} must be at least 1")
+            sys.exit(1)
+    for name in ('scan_objects', 'poll_objects', 'download_objects'):
+        setattr(args, name, min(getattr(args, name), args.objects))
+
+    random.seed(args.seed)
+    tool = load_tool(args.tool)
+    with open(args.tool, 'rb') as f:
+        tool_hash = hashlib.sha256(f.read()).hexdigest()
+
+    started = datetime.now()
+    results = run_benchmarks(tool, args)
+    report = {
+        'started': started.isoformat(timespec='seconds'),
+        'tool': os.path.abspath(args.tool),
+        'tool_sha256': tool_hash,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'parameters': {k: v for k, v in vars(args).items() if k not in ('tool', 'output')},
+        'results': results,
+    }
+    output = args.output or f"restore-benchmark-{started.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Results written to {output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import atexit
+import importlib
+import pathlib
+import shutil
+import sys
+import tempfile
+
+import boto3
+import moto
+import pytest
+
+SCRIPTS = pathlib.Path(__file__).resolve().parent.parent
+# Importable aliases for the hyphenated scripts. It is on sys.path rather than
+# only in sys.modules so forkserver pool workers can import them too.
+MODULES = pathlib.Path(tempfile.mkdtemp(prefix='py-scripts-'))
+sys.path.insert(0, str(MODULES))
+atexit.register(shutil.rmtree, MODULES, ignore_errors=True)
+
+
+def load_script(name):
+    """Import one of the hyphenated scripts in py/ as a module."""
+    module_name = name.replace('-', '_')
+    alias = MODULES / f"{module_name}.py"
+    if not alias.exists():
+        alias.symlink_to(SCRIPTS / f"{name}.py")
+    return importlib.import_module(module_name)
+
+
+@pytest.fixture(scope='session')
+def tool():
+    return load_script('backup-noteify2')
+
+
+@pytest.fixture(scope='session')
+def bench():
+    return load_script('restore-benchmark')
+
+
+@pytest.fixture(scope='session')
+def uploader():
+    return load_script('archive-upload')
+
+
+@pytest.fixture(scope='session')
+def slides():
+    return load_script('archive-slides')
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    """A moto S3 client with an empty bucket named bkt."""
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with moto.mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket='bkt')
+        yield client
@@ -0,0 +1,48 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / 'Slides'
+    for folder, files in {
+        'case1': {'a.svs': 5000, 'tiles/t1.jpg': 3000, 'tiles/deep/t2.jpg': 70000},
+        'case2': {'b.svs': 12000},
+        'Markup/m1': {'m.xml': 900, 'sub/n.xml': 20000},
+        'Controls/c1': {},
+    }.items():
+        (root / folder).mkdir(parents=True)
+        for name, size in files.items():
+            path = root / folder / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b'x' * size)
+    return root
+
+
+def du(*paths):
+    result = subprocess.run(['du', '-s', '-c', '-B1', *map(str, paths)], capture_output=True, text=True, check=True)
+    return int(result.stdout.splitlines()[-1].split()[0])
+
+
+needs_du = pytest.mark.skipif(shutil.which('du') is None, reason='needs du')
+
+
+@needs_du
+def test_tree_usages_match_du_for_every_folder(slides, tree):
+    folders = [tree / 'case1', tree / 'Markup' / 'm1', tree / 'Controls' / 'c1', tree / 'case1' / 'tiles', tree]
+    sizes = slides.tree_usages(str(tree), [str(f) for f in folders])
+    assert sizes == {str(folder): du(folder) for folder in folders}
+
+
+@needs_du
+def test_tree_usages_count_a_hard_link_once_across_folders(slides, tree):
+    os.link(tree / 'case2' / 'b.svs', tree / 'case1' / 'b-link.svs')
+    sizes = slides.tree_usages(str(tree), [str(tree / 'case1'), str(tree / 'case2')])
+    assert sizes[str(tree / 'case1')] + sizes[str(tree / 'case2')] == du(tree / 'case1', tree / 'case2')
+
+
+def test_tree_usages_skips_folders_outside_the_walk(slides, tree):
+    assert slides.tree_usages(str(tree / 'case2'), [str(tree / 'case1')]) == {}
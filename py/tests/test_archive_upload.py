@@ -0,0 +1,29 @@
+import csv
+import gzip
+import io
+
+
+def write_index(path, rows):
+    with gzip.open(path, 'wt', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(('path', 'key', 'offset', 'length', 'size', 'mtime'))
+        writer.writerows(rows)
+
+
+def test_load_index_reads_every_run(uploader, tmp_path):
+    write_index(tmp_path / 'run1.csv.gz', [('a.txt', 'p/a.txt', 0, 10, 10, 100)])
+    write_index(tmp_path / 'run2.csv.gz', [('a.txt', 'p/a.txt', 0, 12, 12, 200), ('b.txt', 'p/b.txt', 0, 5, 5, 300)])
+    (tmp_path / 'notes.txt').write_text('not an index')
+    assert uploader.load_index(str(tmp_path)) == {'a.txt': (12, 200), 'b.txt': (5, 300)}
+
+
+def test_load_index_keeps_rows_before_a_truncated_run(uploader, tmp_path):
+    write_index(tmp_path / 'run1.csv.gz', [('a.txt', 'p/a.txt', 0, 10, 10, 100)])
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb') as f:
+        f.write(b'path,key,offset,length,size,mtime\r\n')
+        f.write(b'b.txt,p/b.txt,0,5,5,300\r\n')
+        f.write(b'c.txt,p/_bundles/r/0.tar,512,7')
+    # A killed run leaves the stream without its end marker
+    (tmp_path / 'run2.csv.gz').write_bytes(buffer.getvalue()[:-8])
+    assert uploader.load_index(str(tmp_path)) == {'a.txt': (10, 100), 'b.txt': (5, 300)}
@@ -0,0 +1,71 @@
+import argparse
+import asyncio
+
+import boto3
+import pytest
+import requests
+
+pytest.importorskip('aiobotocore')
+from moto.server import ThreadedMotoServer  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def endpoint():
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('AWS_ACCESS_KEY_ID', 'testing')
+        mp.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+        mp.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+        server = ThreadedMotoServer(ip_address='127.0.0.1', port=0, verbose=False)
+        server.start()
+        yield f"http://127.0.0.1:{server._server.server_port}"
+        server.stop()
+
+
+@pytest.fixture
+def bucket(endpoint):
+    requests.post(f"{endpoint}/moto-api/reset")
+    s3 = boto3.client('s3', endpoint_url=endpoint, region_name='us-east-1')
+    s3.create_bucket(Bucket='bkt')
+    for key, storage_class in (('p/glacier', 'GLACIER'), ('p/deep', 'DEEP_ARCHIVE'), ('p/plain', 'STANDARD'),
+                               ('q/glacier', 'GLACIER')):
+        s3.put_object(Bucket='bkt', Key=key, Body=b'data', StorageClass=storage_class)
+    return s3
+
+
+def job_args(endpoint, prefix='p/'):
+    return argparse.Namespace(bucket='bkt', prefix=prefix, profile=None, endpoint_url=endpoint, concurrency=4,
+                              restore_days=3)
+
+
+def scan(tool, endpoint, items, list_prefix, skip=lambda key: False):
+    results = {}
+
+    def on_result(key, result, error):
+        results[key] = result.status if result else repr(error)
+
+    governor = tool.RequestGovernor(100, max_attempts=2)
+    complete = asyncio.run(tool.async_scan(job_args(endpoint), governor, items, list_prefix, skip, on_result))
+    return complete, results
+
+
+def test_scan_restores_listed_archived_keys(tool, endpoint, bucket):
+    complete, results = scan(tool, endpoint, [], list_prefix=True)
+    assert complete
+    assert results == {'p/glacier': 'in_progress', 'p/deep': 'in_progress', 'p/plain': 'not_glacier'}
+    assert 'Restore' in bucket.head_object(Bucket='bkt', Key='p/deep')
+
+
+def test_scan_takes_explicit_keys_first_and_skips_handled_ones(tool, endpoint, bucket):
+    complete, results = scan(tool, endpoint, [('q/glacier', None), ('p/missing', None)], list_prefix=True,
+                             skip=lambda key: key == 'p/deep')
+    assert complete
+    assert set(results) == {'q/glacier', 'p/missing', 'p/glacier', 'p/plain'}
+    assert results['q/glacier'] == 'in_progress'
+    assert 'ClientError' in results['p/missing']
+
+
+def test_scan_restores_inventory_keys_without_a_head(tool, endpoint, bucket):
+    listed = ('GLACIER', 4, 'etag', None)
+    complete, results = scan(tool, endpoint, [('p/glacier', listed)], list_prefix=False)
+    assert complete
+    assert results == {'p/glacier': 'in_progress'}
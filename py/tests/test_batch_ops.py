@@ -0,0 +1,138 @@
+import csv
+import io
+from types import SimpleNamespace
+from urllib.parse import unquote_plus
+
+import pytest
+
+BUCKET = 'benchmark'
+
+ODD_KEYS = [
+    'photos/a,b.jpg',
+    'photos/say "cheese".jpg',
+    "photos/it's.jpg",
+    'photos/été 2023/Ærø.jpg',
+    'photos/日本/写真.jpg',
+    'photos/a+b c%20d.jpg',
+]
+
+
+class Journal:
+    def __init__(self):
+        self.statuses = {}
+        self.commits = 0
+
+    def record_status(self, key, status, **kwargs):
+        self.statuses[key] = status
+
+    def commit(self):
+        self.commits += 1
+
+
+@pytest.fixture
+def stub(tool, bench):
+    keys = sorted(ODD_KEYS + ['photos/deep.jpg', 'photos/running.jpg'])
+    classes = ['DEEP_ARCHIVE' if key == 'photos/deep.jpg' else 'GLACIER' for key in keys]
+    return bench.StubS3(tool, keys, [1024] * len(keys), classes, bench.VirtualClock(1.0))
+
+
+@pytest.fixture
+def job_args():
+    return SimpleNamespace(bucket=BUCKET, job_name='test', restore_days=1, timeout=1,
+                           batch_ops_location=f"s3://{BUCKET}/batch/", batch_ops_account='000000000000',
+                           batch_ops_role='arn:aws:iam::000000000000:role/test')
+
+
+def plan(tool, stub, keys):
+    """Run state as the scan leaves it for keys not yet restored; unknown keys count as GLACIER."""
+    status_map = {key: 'not_started' for key in keys}
+    restores = {}
+    for key in keys:
+        storage_class = stub.objects[key][0] if key in stub.objects else 'GLACIER'
+        restores[key] = (storage_class, tool.default_tier(storage_class), None)
+    return status_map, restores
+
+
+def test_manifest_round_trips_awkward_keys(tool):
+    body = tool.batch_manifest(BUCKET, ODD_KEYS).decode()
+    rows = list(csv.reader(io.StringIO(body)))
+    assert [len(row) for row in rows] == [2] * len(ODD_KEYS)
+    assert [row[0] for row in rows] == [BUCKET] * len(ODD_KEYS)
+    assert [unquote_plus(row[1]) for row in rows] == ODD_KEYS
+    # URL-encoding leaves nothing for the CSV writer to quote
+    assert '"' not in body and body.isascii()
+
+
+def test_start_batch_restores_one_job_per_tier(tool, bench, stub, job_args):
+    control = bench.StubS3Control(stub)
+    keys = ODD_KEYS + ['photos/deep.jpg']
+    status_map, restores = plan(tool, stub, keys)
+    status_map['photos/done.jpg'] = 'restored'
+    journal = Journal()
+
+    tool.start_batch_restores(stub, control, job_args, status_map, restores, journal)
+
+    assert control.calls['CreateJob'] == 2
+    assert all(status_map[key] == 'in_progress' for key in keys)
+    assert status_map['photos/done.jpg'] == 'restored'
+    assert journal.statuses == {key: 'in_progress' for key in keys}
+    assert journal.commits == 1
+    # Every key of the manifest reached S3 under its real name
+    assert all(stub.objects[key][4] is not None for key in keys)
+    assert {restores[key][1] for key in ODD_KEYS} == {tool.default_tier('GLACIER')}
+    assert restores['photos/deep.jpg'][1] == tool.default_tier('DEEP_ARCHIVE')
+    assert all(restores[key][2] is not None for key in keys)
+
+
+def test_failed_tasks_map_back_to_keys(tool, bench, stub, job_args):
+    control = bench.StubS3Control(stub)
+    stub.start_restore('photos/running.jpg', 'Standard')
+    keys = ['photos/a,b.jpg', 'photos/running.jpg', 'photos/missing, "gone".jpg', 'photos/日本/写真.jpg']
+    status_map, restores = plan(tool, stub, keys)
+    journal = Journal()
+
+    tool.start_batch_restores(stub, control, job_args, status_map, restores, journal)
+
+    assert status_map == {
+        'photos/a,b.jpg': 'in_progress',
+        # Already restoring counts as started
+        'photos/running.jpg': 'in_progress',
+        'photos/missing, "gone".jpg': 'error',
+        'photos/日本/写真.jpg': 'in_progress',
+    }
+    assert journal.statuses == status_map
+
+
+def test_failed_job_marks_its_keys_error(tool, bench, stub, job_args):
+    control = bench.StubS3Control(stub)
+    create_job = control.create_job
+
+    def failing_job(**kwargs):
+        job_id = create_job(**kwargs)['JobId']
+        control.jobs[job_id].update(Status='Failed', FailureReasons=[{'FailureReason': 'AccessDenied'}])
+        return {'JobId': job_id}
+
+    control.create_job = failing_job
+    status_map, restores = plan(tool, stub, ODD_KEYS[:2])
+    journal = Journal()
+
+    tool.start_batch_restores(stub, control, job_args, status_map, restores, journal)
+
+    assert set(status_map.values()) == {'error'}
+    assert journal.statuses == status_map
+
+
+def test_job_creation_error_marks_keys_error(tool, bench, stub, job_args):
+    control = bench.StubS3Control(stub)
+
+    def refuse(**kwargs):
+        raise bench.client_error('AccessDenied', 403, 'CreateJob')
+
+    control.create_job = refuse
+    status_map, restores = plan(tool, stub, ODD_KEYS[:2])
+    journal = Journal()
+
+    tool.start_batch_restores(stub, control, job_args, status_map, restores, journal)
+
+    assert set(status_map.values()) == {'error'}
+    assert all(stub.objects[key][4] is None for key in ODD_KEYS[:2])
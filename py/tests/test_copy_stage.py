@@ -0,0 +1,81 @@
+import collections
+import errno
+import os
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def staged(tmp_path):
+    staging = tmp_path / 'staging'
+    keys = [f"case{n % 2}/file{n}.svs" for n in range(8)]
+    for key in keys:
+        path = staging / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(key.encode() * 1000)
+        os.utime(path, (1_600_000_000, 1_600_000_000))
+    return staging, tmp_path / 'share', keys
+
+
+def run_stage(tool, staging, share, keys, per_dir=4):
+    stage = tool.CopyStage(str(staging), str(share), workers=8, per_dir=per_dir)
+    try:
+        stage.prepare(keys)
+        for key in keys:
+            stage.submit(key)
+        return {key: (dest, error) for key, dest, error in stage.drain(wait=True)}
+    finally:
+        stage.close()
+
+
+def test_copy_stage_delivers_every_file_with_its_mtime(tool, staged):
+    staging, share, keys = staged
+    results = run_stage(tool, staging, share, keys)
+    assert results == {key: (str(share / key), None) for key in keys}
+    for key in keys:
+        assert (share / key).read_bytes() == (staging / key).read_bytes()
+        assert os.stat(share / key).st_mtime == 1_600_000_000
+    assert not [name for _, _, names in os.walk(share) for name in names if name.endswith('.tmp')]
+
+
+def test_copy_stage_limits_copies_per_directory(tool, staged, monkeypatch):
+    staging, share, keys = staged
+    active = collections.Counter()
+    peak = collections.Counter()
+    lock = threading.Lock()
+
+    def slow_copy(src, dest, throttle=None):
+        directory = os.path.dirname(dest)
+        with lock:
+            active[directory] += 1
+            peak[directory] = max(peak[directory], active[directory])
+        time.sleep(0.02)
+        with lock:
+            active[directory] -= 1
+        return dest
+
+    monkeypatch.setattr(tool, 'copy_file', slow_copy)
+    results = run_stage(tool, staging, share, keys, per_dir=2)
+    assert len(results) == len(keys)
+    assert set(peak.values()) == {2}
+
+
+def test_copy_stage_reports_failed_copies(tool, staged):
+    staging, share, keys = staged
+    (staging / keys[0]).unlink()
+    results = run_stage(tool, staging, share, keys)
+    assert isinstance(results[keys[0]][1], FileNotFoundError)
+    assert all(error is None for key, (_, error) in results.items() if key != keys[0])
+
+
+def test_copy_file_falls_back_when_copy_file_range_is_refused(tool, tmp_path, monkeypatch):
+    def refuse(*args):
+        raise OSError(errno.EXDEV, 'cross-device')
+
+    monkeypatch.setattr(tool.os, 'copy_file_range', refuse, raising=False)
+    src = tmp_path / 'src.bin'
+    src.write_bytes(os.urandom(100_000))
+    assert tool.copy_file(str(src), str(tmp_path / 'dest.bin')) == str(tmp_path / 'dest.bin')
+    assert (tmp_path / 'dest.bin').read_bytes() == src.read_bytes()
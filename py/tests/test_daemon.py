@@ -0,0 +1,127 @@
+import argparse
+import json
+import os
+import threading
+
+import pytest
+import requests
+
+
+@pytest.fixture
+def roots(tmp_path):
+    downloads = tmp_path / 'downloads'
+    share = tmp_path / 'share'
+    downloads.mkdir()
+    share.mkdir()
+    return downloads, share
+
+
+@pytest.fixture
+def token_file(tmp_path):
+    path = tmp_path / 'token'
+    path.write_text('s3cret\n')
+    path.chmod(0o600)
+    return path
+
+
+@pytest.fixture
+def daemon(tool, roots, token_file, monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    downloads, share = roots
+    args = argparse.Namespace(
+        bucket='bkt', prefix=None, keys=[], key_file=None, inventory_manifest=None, job_name=None, resume=None,
+        download_dir=str(downloads), network_share=str(share), daemon_root=None,
+        daemon_token_file=str(token_file), daemon_port=0, daemon_socket=None, daemon_jobs=2,
+        profile=None, endpoint_url=None, max_request_rate=100, max_attempts=3, concurrency=4,
+        download_workers=2, transfer_threads=2, check_interval=60, min_check_interval=10,
+        poll_schedule='adaptive',
+    )
+    daemon = tool.RestoreDaemon(args)
+    yield daemon
+    daemon.downloads.shutdown()
+
+
+def test_read_daemon_token(tool, token_file):
+    assert tool.read_daemon_token(str(token_file)) == 's3cret'
+
+
+@pytest.mark.parametrize('mode, content', [(0o644, 's3cret'), (0o600, '\n'), (None, None)])
+def test_read_daemon_token_rejects_bad_files(tool, tmp_path, mode, content):
+    path = tmp_path / 'token'
+    if content is not None:
+        path.write_text(content)
+        path.chmod(mode)
+    with pytest.raises(ValueError):
+        tool.read_daemon_token(str(path))
+
+
+def test_allowed_path(daemon, roots, tmp_path):
+    downloads, share = roots
+    (tmp_path / 'downloads2').mkdir()
+    os.symlink(tmp_path, downloads / 'escape')
+    assert daemon.allowed_path(str(downloads))
+    assert daemon.allowed_path(str(share / 'case' / 'new'))
+    assert not daemon.allowed_path(str(tmp_path / 'downloads2'))
+    assert not daemon.allowed_path(str(downloads / '..' / 'elsewhere'))
+    assert not daemon.allowed_path(str(downloads / 'escape' / 'elsewhere'))
+
+
+@pytest.mark.parametrize('options', [
+    {'download_dir': '/etc/cron.d'},
+    {'key_file': '/etc/shadow'},
+    {'network_share': 'relative/share'},
+    {'job_name': '../../tmp/x'},
+    {'job_name': '..'},
+    {'resume': ''},
+    {'bucket': 5},
+    {'shell': 'rm -rf /'},
+])
+def test_submit_rejects_bad_options(daemon, options):
+    with pytest.raises(ValueError):
+        daemon.submit(options)
+    assert daemon.jobs == {}
+
+
+def test_submit_runs_a_job_confined_to_the_roots(tool, daemon, roots, monkeypatch):
+    ran = []
+
+    def main(args):
+        ran.append(args)
+        raise SystemExit(0)
+    monkeypatch.setattr(tool, 'main', main)
+    downloads, _ = roots
+    job = daemon.submit({'prefix': 'cases/', 'download_dir': str(downloads / 'run1'),
+                         'inventory_manifest': 's3://inventory/manifest.json', 'job_name': 'run1'})
+    for thread in threading.enumerate():
+        if thread.name == 'run1':
+            thread.join(5)
+    assert job.state == 'succeeded'
+    assert ran[0].download_dir == str(downloads / 'run1')
+    assert ran[0].daemon_token_file is None and ran[0].daemon_port is None
+
+
+@pytest.fixture
+def api(daemon):
+    server = daemon.create_server()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_api_requires_the_bearer_token(api):
+    assert requests.get(f"{api}/jobs").status_code == 401
+    assert requests.get(f"{api}/jobs", headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = requests.get(f"{api}/jobs", headers={'Authorization': 'Bearer s3cret'})
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_api_rejects_non_json_and_bad_options(api, tmp_path):
+    auth = {'Authorization': 'Bearer s3cret'}
+    body = json.dumps({'download_dir': str(tmp_path)})
+    assert requests.post(f"{api}/jobs", data=body, headers=auth).status_code == 415
+    response = requests.post(f"{api}/jobs", data=body, headers={**auth, 'Content-Type': 'application/json'})
+    assert response.status_code == 400
+    assert 'must be under' in response.json()['error']
@@ -0,0 +1,116 @@
+import boto3
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError, ReadTimeoutError
+from botocore.stub import Stubber
+
+
+def client_error(code, status):
+    return ClientError({'Error': {'Code': code}, 'ResponseMetadata': {'HTTPStatusCode': status}}, 'HeadObject')
+
+
+@pytest.mark.parametrize('error, kind', [
+    (client_error('SlowDown', 503), 'throttle'),
+    (client_error('ThrottlingException', 400), 'throttle'),
+    (client_error('', 429), 'throttle'),
+    (client_error('InternalError', 500), 'transient'),
+    (client_error('RequestTimeout', 400), 'transient'),
+    (client_error('', 502), 'transient'),
+    (client_error('AccessDenied', 403), 'fatal'),
+    (client_error('404', 404), 'fatal'),
+    (EndpointConnectionError(endpoint_url='https://s3'), 'transient'),
+    (ReadTimeoutError(endpoint_url='https://s3'), 'transient'),
+    (ValueError('bad input'), 'fatal'),
+])
+def test_classify_error(tool, error, kind):
+    assert tool.classify_error(error) == kind
+
+
+@pytest.fixture
+def sleeps(tool, monkeypatch):
+    slept = []
+    monkeypatch.setattr(tool.time, 'sleep', slept.append)
+    return slept
+
+
+def flaky(*errors, result='ok'):
+    """A call that raises each of errors in turn, then returns result."""
+    errors = list(errors)
+    calls = []
+
+    def call():
+        calls.append(1)
+        if errors:
+            raise errors.pop(0)
+        return result
+    call.calls = calls
+    return call
+
+
+def test_backoff_is_full_jitter_capped_exponential(tool):
+    governor = tool.RequestGovernor(100, base_delay=0.25, max_delay=2.0)
+    for attempt in range(8):
+        delays = [governor.backoff(attempt) for _ in range(200)]
+        assert all(0 <= d <= min(2.0, 0.25 * 2 ** attempt) for d in delays)
+    assert max(governor.backoff(7) for _ in range(200)) > 1.0
+
+
+def test_throttles_are_retried_and_cut_the_operation_rate(tool, sleeps):
+    governor = tool.RequestGovernor(100, max_attempts=4)
+    call = flaky(client_error('SlowDown', 503), client_error('SlowDown', 503))
+    assert governor.call('HeadObject', call) == 'ok'
+    assert len(call.calls) == 3
+    # Both throttles land within a second, so they count as one cut; the
+    # success then adds 1/rate
+    assert governor.limiter('HeadObject').rate == 50 + 1 / 50
+    assert governor.limiter('RestoreObject').rate == 100
+
+
+def test_transient_errors_are_retried_without_cutting_the_rate(tool, sleeps):
+    governor = tool.RequestGovernor(100, max_attempts=4)
+    call = flaky(client_error('InternalError', 500), EndpointConnectionError(endpoint_url='https://s3'))
+    assert governor.call('GetObject', call) == 'ok'
+    assert len(call.calls) == 3
+    assert governor.limiter('GetObject').rate == 100
+
+
+def test_fatal_errors_are_raised_at_once(tool, sleeps):
+    governor = tool.RequestGovernor(100, max_attempts=4)
+    call = flaky(client_error('AccessDenied', 403))
+    with pytest.raises(ClientError):
+        governor.call('HeadObject', call)
+    assert len(call.calls) == 1
+
+
+def test_retries_stop_after_max_attempts(tool, sleeps):
+    governor = tool.RequestGovernor(100, max_attempts=3)
+    call = flaky(*[client_error('InternalError', 500)] * 5)
+    with pytest.raises(ClientError):
+        governor.call('HeadObject', call)
+    assert len(call.calls) == 3
+
+
+def test_limiter_rate_halves_once_a_second_and_recovers(tool, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(tool.time, 'monotonic', lambda: now[0])
+    limiter = tool.OperationLimiter(8, min_rate=2)
+    assert limiter.on_throttle() == 4
+    assert limiter.on_throttle() is None
+    now[0] += 1
+    assert limiter.on_throttle() == 2
+    now[0] += 1
+    assert limiter.on_throttle() == 2
+    limiter.on_success()
+    assert limiter.rate == 2.5
+
+
+def test_governed_client_routes_api_calls_through_the_governor(tool, sleeps):
+    client = boto3.client('s3', region_name='us-east-1', aws_access_key_id='x', aws_secret_access_key='x')
+    governor = tool.RequestGovernor(100, max_attempts=3)
+    governed = tool.GovernedClient(client, governor)
+    with Stubber(client) as stubber:
+        stubber.add_client_error('head_object', 'SlowDown', http_status_code=503)
+        stubber.add_response('head_object', {'ContentLength': 5}, {'Bucket': 'b', 'Key': 'k'})
+        assert governed.head_object(Bucket='b', Key='k')['ContentLength'] == 5
+    assert governor.limiter('HeadObject').rate == 50 + 1 / 50
+    # Non-API attributes are the client's own
+    assert governed.meta is client.meta
@@ -0,0 +1,96 @@
+import base64
+import hashlib
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+MODIFIED = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+SINGLE_ETAG = 'c' * 32
+MULTIPART_ETAG = 'd' * 32 + '-3'
+
+
+def put(root, key, data):
+    path = os.path.join(root, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    os.utime(path, (MODIFIED.timestamp(), MODIFIED.timestamp()))
+
+
+def sha256(data):
+    return 'sha256', base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    staging, share = tmp_path / 'dl', tmp_path / 'share'
+    staging.mkdir()
+    share.mkdir()
+    return str(staging), str(share)
+
+
+def plan(tool, keys, data, dirs, etag=SINGLE_ETAG, checksum_of=None):
+    sizes = {key: len(data) for key in keys}
+    meta = {key: (etag, MODIFIED) for key in keys}
+    return tool.plan_incremental(keys, sizes, meta, *dirs, checksum_of)
+
+
+def test_current_share_copy_needs_no_staged_copy(tool, dirs):
+    staging, share = dirs
+    put(share, 'a/current.jpg', b'x' * 10)
+    put(staging, 'a/staged.jpg', b'x' * 10)
+    keys = ['a/current.jpg', 'a/staged.jpg', 'a/missing.jpg']
+    to_download, copy_only, current = plan(tool, keys, b'x' * 10, dirs)
+    assert current == ['a/current.jpg']
+    assert copy_only == ['a/staged.jpg']
+    assert to_download == ['a/missing.jpg']
+
+
+def test_stale_share_copy_is_replaced_from_current_staged_copy(tool, dirs):
+    staging, share = dirs
+    put(share, 'a/b.jpg', b'x' * 9)
+    put(staging, 'a/b.jpg', b'x' * 10)
+    assert plan(tool, ['a/b.jpg'], b'x' * 10, dirs) == ([], ['a/b.jpg'], [])
+
+
+def test_share_only(tool, dirs):
+    _, share = dirs
+    put(share, 'a/b.jpg', b'x' * 10)
+    assert tool.plan_incremental(['a/b.jpg', 'a/c.jpg'], {'a/b.jpg': 10, 'a/c.jpg': 10},
+                                 {'a/b.jpg': (SINGLE_ETAG, MODIFIED)}, None, share) == (['a/c.jpg'], [], ['a/b.jpg'])
+
+
+def test_multipart_etag_is_checked_against_stored_checksum(tool, dirs):
+    staging, share = dirs
+    data = b'archived image' * 50
+    put(share, 'good.tif', data)
+    # Same size and mtime, different bytes: only the checksum tells them apart
+    put(share, 'bad.tif', data[::-1])
+    put(staging, 'bad.tif', data[::-1])
+    calls = []
+
+    def checksum_of(key):
+        calls.append(key)
+        return sha256(data)
+
+    to_download, copy_only, current = plan(tool, ['good.tif', 'bad.tif'], data, dirs, MULTIPART_ETAG, checksum_of)
+    assert current == ['good.tif']
+    assert to_download == ['bad.tif'] and copy_only == []
+    assert sorted(calls) == ['bad.tif', 'good.tif']
+
+
+def test_multipart_etag_without_checksum_falls_back_to_mtime(tool, dirs):
+    _, share = dirs
+    put(share, 'a.tif', b'y' * 20)
+    assert plan(tool, ['a.tif'], b'y' * 20, dirs, MULTIPART_ETAG, lambda key: None)[2] == ['a.tif']
+
+
+def test_single_part_etag_does_not_fetch_checksums(tool, dirs):
+    _, share = dirs
+    put(share, 'a.tif', b'y' * 20)
+
+    def checksum_of(key):
+        raise AssertionError('no HEAD expected')
+
+    assert plan(tool, ['a.tif'], b'y' * 20, dirs, SINGLE_ETAG, checksum_of)[2] == ['a.tif']
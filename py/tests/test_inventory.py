@@ -0,0 +1,50 @@
+import gzip
+import json
+
+import pytest
+
+SCHEMA = 'Bucket, Key, Size, StorageClass, IsLatest, IsDeleteMarker, ETag'
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    files = {
+        'data/one.csv.gz': [
+            'bkt,photos/a%20b.jpg,10,GLACIER,true,false,e1',
+            'bkt,photos/c.jpg,20,STANDARD,true,false,e2',
+        ],
+        'data/two.csv.gz': [
+            'bkt,docs/d.pdf,30,DEEP_ARCHIVE,true,false,e3',
+            'bkt,docs/old.pdf,40,GLACIER,false,false,e4',
+            'bkt,docs/gone.pdf,0,GLACIER,true,true,',
+        ],
+    }
+    (tmp_path / 'data').mkdir()
+    for key, lines in files.items():
+        with gzip.open(tmp_path / key, 'wt') as f:
+            f.write('\n'.join(lines) + '\n')
+    # Laid out as `aws s3 sync` leaves an inventory destination
+    (tmp_path / 'manifest').mkdir()
+    path = tmp_path / 'manifest' / 'manifest.json'
+    path.write_text(json.dumps({
+        'sourceBucket': 'bkt',
+        'fileFormat': 'CSV',
+        'fileSchema': SCHEMA,
+        'files': [{'key': key} for key in files],
+    }))
+    return str(path)
+
+
+def test_inventory_rows_read_across_worker_processes(tool, manifest):
+    stats = {'skipped': 0}
+    rows = list(tool.iter_inventory_rows(None, manifest, 'bkt', 2, stats))
+    assert sorted((key, sc, size) for key, sc, size, _, _ in rows) == [
+        ('docs/d.pdf', 'DEEP_ARCHIVE', 30),
+        ('photos/a b.jpg', 'GLACIER', 10),
+    ]
+    assert stats['skipped'] == 3
+
+
+def test_inventory_for_another_bucket_is_refused(tool, manifest):
+    with pytest.raises(ValueError):
+        list(tool.iter_inventory_rows(None, manifest, 'other', 2, {'skipped': 0}))
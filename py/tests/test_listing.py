@@ -0,0 +1,102 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+
+class CountingS3:
+    def __init__(self, s3, **extra):
+        self.s3 = s3
+        self.extra = extra
+        self.pages = 0
+
+    def list_objects_v2(self, **params):
+        self.pages += 1
+        return self.s3.list_objects_v2(**params, **self.extra)
+
+
+def test_iter_prefix_objects_follows_continuation_tokens(tool, s3):
+    keys = [f"p/{n:02}" for n in range(7)]
+    for key in keys + ['q/outside']:
+        s3.put_object(Bucket='bkt', Key=key, Body=b'')
+    counting = CountingS3(s3)
+    listed = [obj['Key'] for obj in tool.iter_prefix_objects(counting, 'bkt', 'p/', MaxKeys=2)]
+    assert listed == keys
+    assert counting.pages == 4
+
+
+def test_iter_prefix_keys_is_lazy(tool, s3):
+    for n in range(7):
+        s3.put_object(Bucket='bkt', Key=f"p/{n:02}", Body=b'')
+    counting = CountingS3(s3, MaxKeys=2)
+    keys = tool.iter_prefix_keys(counting, 'bkt', 'p/')
+    assert [next(keys), next(keys)] == ['p/00', 'p/01']
+    assert counting.pages == 1
+    assert next(keys) == 'p/02'
+    assert counting.pages == 2
+
+
+def test_prefetch_yields_everything_in_order(tool):
+    assert list(tool.prefetch(iter(range(100)), maxsize=3)) == list(range(100))
+
+
+def test_prefetch_reraises_the_producer_error(tool):
+    def items():
+        yield 1
+        raise ValueError('listing failed')
+
+    consumer = tool.prefetch(items(), maxsize=3)
+    assert next(consumer) == 1
+    with pytest.raises(ValueError, match='listing failed'):
+        next(consumer)
+
+
+def test_prefetch_stops_the_producer_when_the_consumer_stops(tool):
+    produced = []
+    finished = threading.Event()
+
+    def items():
+        try:
+            for n in range(10000):
+                produced.append(n)
+                yield n
+        finally:
+            finished.set()
+
+    consumer = tool.prefetch(items(), maxsize=2)
+    assert next(consumer) == 0
+    consumer.close()
+    assert finished.wait(5)
+    assert len(produced) < 10
+
+
+def test_bounded_map_limits_work_in_flight(tool):
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def work(n):
+        with lock:
+            running.append(n)
+            peak.append(len(running))
+        time.sleep(0.01)
+        with lock:
+            running.remove(n)
+        return n * 2
+
+    consumed = []
+
+    def items():
+        for n in range(20):
+            consumed.append(n)
+            yield n
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = {}
+        for item, future in tool.bounded_map(executor, work, items(), 3):
+            # Never more than max_in_flight items taken from the source ahead of the results
+            assert len(consumed) - len(results) <= 3
+            results[item] = future.result()
+    assert results == {n: n * 2 for n in range(20)}
+    assert max(peak) <= 3
@@ -0,0 +1,73 @@
+import pytest
+
+
+@pytest.fixture
+def registry(tool):
+    registry = tool.Metrics()
+    registry.enable()
+    return registry
+
+
+def test_nothing_is_recorded_until_enabled(tool):
+    registry = tool.Metrics()
+    registry.inc('transfers_total', stage='download', outcome='ok')
+    registry.observe('s3_request_seconds', 0.2, operation='HeadObject')
+    assert registry.render() == '\n'
+
+
+def test_counters_and_gauges_render_with_help_and_labels(registry):
+    registry.inc('transfers_total', stage='download', outcome='ok')
+    registry.inc('transfers_total', 2, outcome='ok', stage='download')
+    registry.set('queue_depth', 7, queue='restore')
+    assert registry.render().splitlines() == [
+        '# HELP glacier_restore_queue_depth Items waiting in a pipeline queue',
+        '# TYPE glacier_restore_queue_depth gauge',
+        'glacier_restore_queue_depth{queue="restore"} 7',
+        '# HELP glacier_restore_transfers_total Finished transfers by stage and outcome',
+        '# TYPE glacier_restore_transfers_total counter',
+        'glacier_restore_transfers_total{outcome="ok",stage="download"} 3',
+    ]
+
+
+def test_histogram_buckets_are_cumulative(tool, registry):
+    for seconds in (0.003, 0.2, 0.2, 100):
+        registry.observe('s3_request_seconds', seconds, operation='HeadObject')
+    lines = registry.render().splitlines()
+    buckets = {line.split('le="')[1].split('"')[0]: int(line.split()[-1])
+               for line in lines if '_bucket{' in line}
+    assert buckets['0.005'] == 1
+    assert buckets['0.1'] == 1
+    assert buckets['0.25'] == 3
+    assert buckets['60'] == 3
+    assert buckets['+Inf'] == 4
+    assert len(buckets) == len(tool.LATENCY_BUCKETS) + 1
+    assert 'glacier_restore_s3_request_seconds_sum{operation="HeadObject"} 100.403000' in lines
+    assert 'glacier_restore_s3_request_seconds_count{operation="HeadObject"} 4' in lines
+
+
+def test_collectors_refresh_gauges_until_removed(registry):
+    calls = []
+
+    def collect():
+        calls.append(1)
+        registry.set('jobs', len(calls), state='running')
+
+    def broken():
+        raise RuntimeError('collector failed')
+
+    registry.add_collector(broken)
+    registry.add_collector(collect)
+    assert 'glacier_restore_jobs{state="running"} 1' in registry.render()
+    registry.remove_collector(collect)
+    registry.remove_collector(collect)
+    assert 'glacier_restore_jobs{state="running"} 1' in registry.render()
+    assert len(calls) == 1
+
+
+def test_exporter_writes_the_textfile_on_stop(tool, registry, tmp_path):
+    path = tmp_path / 'restore.prom'
+    exporter = tool.MetricsExporter(registry, str(path), interval=3600).start()
+    registry.inc('transfers_total', stage='copy', outcome='error')
+    exporter.stop()
+    assert 'glacier_restore_transfers_total{outcome="error",stage="copy"} 1' in path.read_text()
+    assert [p.name for p in tmp_path.iterdir()] == ['restore.prom']
@@ -0,0 +1,100 @@
+import http.server
+import json
+import smtplib
+import threading
+
+import pytest
+
+
+class Webhook(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.posts.append((self.client_address, body['attachments'][0]['content']['body'][0]['text']))
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def webhook(monkeypatch):
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Webhook)
+    server.posts = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv('TEAMS_WEBHOOK_URL', f"http://127.0.0.1:{server.server_address[1]}/hook")
+    yield server.posts
+    server.shutdown()
+    server.server_close()
+
+
+def test_teams_messages_share_one_connection(tool, webhook):
+    dispatcher = tool.NotificationDispatcher(teams=True).start()
+    dispatcher.notify('Started', 'Restoring 10 objects')
+    dispatcher.notify('Finished', 'Restored 10 objects')
+    assert dispatcher.close() == {'teams': True}
+    assert [title for _, title in webhook] == ['Started', 'Finished']
+    assert webhook[0][0] == webhook[1][0]
+
+
+def test_progress_digests_waiting_to_be_sent_are_coalesced(tool, webhook):
+    dispatcher = tool.NotificationDispatcher(teams=True)
+    dispatcher.notify('Started', 'Restoring 10 objects')
+    for done in range(1, 4):
+        dispatcher.progress(f"Progress {done}/10", f"{done} restored")
+    dispatcher.start()
+    dispatcher.close()
+    assert [title for _, title in webhook] == ['Started', 'Progress 3/10']
+
+
+def test_progress_due_is_rate_limited(tool, webhook, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(tool.time, 'monotonic', lambda: now[0])
+    dispatcher = tool.NotificationDispatcher(teams=True, progress_interval=600)
+    assert not dispatcher.progress_due()
+    now[0] += 600
+    assert dispatcher.progress_due()
+    dispatcher.progress('Progress', 'half way')
+    assert not dispatcher.progress_due()
+    assert not tool.NotificationDispatcher(teams=True, progress_interval=0).progress_due()
+
+
+def test_channels_without_settings_are_disabled(tool, monkeypatch):
+    monkeypatch.delenv('TEAMS_WEBHOOK_URL', raising=False)
+    monkeypatch.delenv('SMTP_SERVER', raising=False)
+    dispatcher = tool.NotificationDispatcher(email=True, teams=True).start()
+    dispatcher.notify('Finished', 'done')
+    assert (dispatcher.email, dispatcher.teams) == (False, False)
+    assert dispatcher.close() == {}
+
+
+class FakeSMTP:
+    def __init__(self, fail):
+        self.fail = fail
+        self.sent = []
+        self.closed = False
+
+    def send_message(self, msg):
+        if self.fail:
+            raise smtplib.SMTPServerDisconnected('idle timeout')
+        self.sent.append(msg['Subject'])
+
+    def quit(self):
+        self.closed = True
+
+
+def test_email_reconnects_once_after_an_idle_disconnect(tool, monkeypatch):
+    for var in tool.EMAIL_VARS:
+        monkeypatch.setenv(var, 'value')
+    connections = [FakeSMTP(fail=True), FakeSMTP(fail=False)]
+    opened = iter(connections)
+    monkeypatch.setattr(tool, 'open_smtp_connection', lambda: next(opened))
+    dispatcher = tool.NotificationDispatcher(email=True).start()
+    dispatcher.notify('First', 'body')
+    dispatcher.notify('Second', 'body')
+    assert dispatcher.close() == {'email': True}
+    assert connections[0].closed
+    assert connections[1].sent == ['First', 'Second']
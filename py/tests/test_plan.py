@@ -0,0 +1,55 @@
+import argparse
+
+import pytest
+
+
+class ListOnly:
+    """Lets the planner list the bucket and nothing else."""
+
+    def __init__(self, s3):
+        self.s3 = s3
+
+    def list_objects_v2(self, **params):
+        return self.s3.list_objects_v2(**params)
+
+
+def plan_args(**overrides):
+    args = dict(bucket='bkt', prefix='cases/', inventory_manifest=None, check_interval=60, min_check_interval=10,
+                poll_schedule='adaptive', sqs_queue_url=None, max_request_rate=100, plan_throughput=100,
+                max_bandwidth=0, restore_days=3)
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+@pytest.mark.parametrize('storage_class, tier, polls', [
+    # First check an interval into the window, then hourly until mid-window
+    ('GLACIER', 'Standard', 1),
+    ('DEEP_ARCHIVE', 'Bulk', 18),
+])
+def test_estimate_polls_follows_the_scheduler(tool, storage_class, tier, polls):
+    assert tool.estimate_polls(plan_args(), storage_class, tier) == polls
+
+
+def test_estimate_polls_on_a_fixed_schedule(tool):
+    assert tool.estimate_polls(plan_args(poll_schedule='fixed'), 'GLACIER', 'Standard') == 4
+
+
+def test_plan_counts_objects_from_the_listing_alone(tool, s3):
+    for key, storage_class, size in (('cases/a.svs', 'GLACIER', 3000), ('cases/b.svs', 'DEEP_ARCHIVE', 5000),
+                                     ('cases/notes.txt', 'STANDARD', 100), ('other/c.svs', 'GLACIER', 7)):
+        s3.put_object(Bucket='bkt', Key=key, Body=b'x' * size, StorageClass=storage_class)
+    report = tool.plan_restore(ListOnly(s3), plan_args(), {'cases/a.svs', 'elsewhere/d.svs'}).splitlines()
+    for line in (
+        'Need restore: 2 objects (0.00 GB)',
+        'Not archived (skipped): 1 objects (0.00 GB)',
+        'Explicit keys not covered by the listing (checked with HEAD at run time): 1',
+        '  LIST: 1',
+        '  RestoreObject: 2',
+        '  HEAD status checks: ~19 (adaptive schedule, fewer with --sqs-queue-url)',
+        '  GET: ~2 objects plus ranged parts of large ones',
+    ):
+        assert line in report
+    rows = [line.split() for line in report if line.startswith(('GLACIER', 'DEEP_ARCHIVE'))]
+    assert [row[:3] for row in rows if row[1].endswith('*')] == [
+        ['GLACIER', 'Standard*', '1'], ['DEEP_ARCHIVE', 'Bulk*', '1'],
+    ]
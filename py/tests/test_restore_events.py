@@ -0,0 +1,94 @@
+import json
+
+import boto3
+import moto
+import pytest
+
+
+def restore_event(key, bucket='photos', event='ObjectRestore:Completed'):
+    return {
+        'eventName': event,
+        's3': {'bucket': {'name': bucket}, 'object': {'key': key}},
+    }
+
+
+def body(*records):
+    return json.dumps({'Records': list(records)})
+
+
+@pytest.fixture
+def sqs(monkeypatch, tool):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setattr(tool, 'SQS_WAIT_SECONDS', 1)
+    with moto.mock_aws():
+        yield boto3.client('sqs', region_name='us-east-1')
+
+
+@pytest.fixture
+def queue_url(sqs):
+    # Messages left undeleted come straight back, so remaining() sees them
+    return sqs.create_queue(QueueName='restores', Attributes={'VisibilityTimeout': '0'})['QueueUrl']
+
+
+def send(sqs, queue_url, *bodies):
+    for message in bodies:
+        sqs.send_message(QueueUrl=queue_url, MessageBody=message)
+
+
+def remaining(sqs, queue_url):
+    messages = sqs.receive_message(QueueUrl=queue_url, MaxNumberOfMessages=10).get('Messages', [])
+    return sorted(message['Body'] for message in messages)
+
+
+def test_parse_completed_restore(tool):
+    assert tool.parse_restore_events(body(restore_event('a/b.jpg')), 'photos') == ['a/b.jpg']
+
+
+def test_parse_decodes_url_encoded_keys(tool):
+    event = restore_event('2023/My+Photo%2C+%C3%A9t%C3%A9.jpg')
+    assert tool.parse_restore_events(body(event), 'photos') == ['2023/My Photo, été.jpg']
+
+
+def test_parse_unwraps_sns_envelope(tool):
+    envelope = json.dumps({'Type': 'Notification', 'Message': body(restore_event('x.jpg'))})
+    assert tool.parse_restore_events(envelope, 'photos') == ['x.jpg']
+
+
+def test_parse_skips_other_buckets_and_events(tool):
+    records = [
+        restore_event('other.jpg', bucket='elsewhere'),
+        restore_event('started.jpg', event='ObjectRestore:Post'),
+        restore_event('expired.jpg', event='ObjectRestore:Delete'),
+        restore_event('done.jpg'),
+    ]
+    assert tool.parse_restore_events(body(*records), 'photos') == ['done.jpg']
+
+
+def test_parse_test_event_has_no_keys(tool):
+    assert tool.parse_restore_events(json.dumps({'Event': 's3:TestEvent'}), 'photos') == []
+
+
+def test_parse_rejects_invalid_json(tool):
+    with pytest.raises(ValueError):
+        tool.parse_restore_events('not json', 'photos')
+
+
+def test_receive_deletes_only_pending_keys(tool, sqs, queue_url):
+    theirs = body(restore_event('theirs.jpg'))
+    send(sqs, queue_url, body(restore_event('mine.jpg')), theirs,
+         body(restore_event('mine2.jpg'), restore_event('theirs2.jpg')))
+    keys = tool.receive_restore_events(sqs, queue_url, 'photos', {'mine.jpg', 'mine2.jpg'})
+    assert sorted(keys) == ['mine.jpg', 'mine2.jpg']
+    assert remaining(sqs, queue_url) == [theirs]
+
+
+def test_receive_deletes_malformed_and_test_events(tool, sqs, queue_url):
+    theirs = body(restore_event('theirs.jpg'))
+    send(sqs, queue_url, '{broken', json.dumps({'Event': 's3:TestEvent'}), theirs)
+    assert tool.receive_restore_events(sqs, queue_url, 'photos', {'mine.jpg'}) == []
+    assert remaining(sqs, queue_url) == [theirs]
+
+
+def test_receive_without_messages_returns_nothing(tool, sqs, queue_url):
+    assert tool.receive_restore_events(sqs, queue_url, 'photos', {'mine.jpg'}) == []
@@ -0,0 +1,27 @@
+HOUR = 3600
+
+
+def test_adaptive_first_check_is_an_interval_into_the_window(tool):
+    scheduler = tool.RestoreScheduler(600, HOUR)
+    scheduler.add('deep', 'DEEP_ARCHIVE', 'Bulk', started=0.0, now=0.0)
+    scheduler.add('expedited', 'GLACIER', 'Expedited', started=0.0, now=0.0)
+    assert scheduler.delay('deep', 0.0) == 13 * HOUR
+    # A window shorter than the interval is checked at its close, floored at min_interval
+    assert scheduler.delay('expedited', 0.0) == 600
+    assert scheduler.delay('deep', 20 * HOUR) == HOUR
+    assert scheduler.delay('deep', 60 * HOUR) == HOUR
+
+
+def test_jitter_is_scaled_to_the_check_interval(tool):
+    scheduler = tool.RestoreScheduler(600, HOUR)
+    for n in range(50):
+        scheduler.add(n, 'DEEP_ARCHIVE', 'Bulk', started=0.0, now=0.0)
+    assert all(abs(due - 13 * HOUR) <= 0.1 * HOUR for due, _ in scheduler.heap)
+
+
+def test_fixed_schedule_checks_every_interval(tool):
+    scheduler = tool.RestoreScheduler(600, HOUR, adaptive=False)
+    scheduler.add('key', 'DEEP_ARCHIVE', 'Bulk', started=0.0, now=0.0)
+    assert scheduler.delay('key', 0.0) == HOUR
+    assert scheduler.pop_due(0.8 * HOUR) == []
+    assert scheduler.pop_due(1.2 * HOUR) == ['key']
@@ -0,0 +1,112 @@
+import argparse
+import collections
+import gzip
+import json
+import multiprocessing
+import queue
+import zlib
+
+import pytest
+
+SHARDS = 3
+
+
+def test_shard_of_is_stable_crc32(tool):
+    assert tool.shard_of('cases/2021/a.svs', 4) == zlib.crc32(b'cases/2021/a.svs') % 4
+    assert tool.shard_of('cases/2021/é.svs', 4) == tool.shard_of('cases/2021/é.svs', 4)
+
+
+def test_shard_of_spreads_keys_evenly(tool):
+    counts = collections.Counter(tool.shard_of(f"cases/{n // 100}/{n}.svs", 4) for n in range(8000))
+    assert set(counts) == {0, 1, 2, 3}
+    assert all(1800 < count < 2200 for count in counts.values())
+
+
+def test_merge_shard_journals(tool, tmp_path):
+    for index, statuses in ((0, {'a': ('restored', 10), 'b': ('error', None)}), (2, {'c': ('in_progress', 30)})):
+        journal = tool.RestoreJournal(tool.journal_path(str(tmp_path), tool.shard_job_name('job', index, SHARDS)))
+        journal.add_keys(['unchecked'])
+        for key, (status, size) in statuses.items():
+            journal.record_status(key, status, 'GLACIER', size)
+        journal.close()
+    # Shard 2 of 3 never wrote a journal
+    status_map, sizes = tool.merge_shard_journals(str(tmp_path), 'job', SHARDS)
+    assert status_map == {'a': 'restored', 'b': 'error', 'c': 'in_progress', 'unchecked': 'queued'}
+    assert sizes == {'a': 10, 'b': 0, 'c': 30, 'unchecked': 0}
+
+
+@pytest.mark.parametrize('complete', [True, False])
+def test_iter_shard_entries_reads_batches_until_the_end_marker(tool, complete):
+    entries = queue.Queue()
+    for item in ([('a', None), ('b', None)], [('c', None)], complete):
+        entries.put(item)
+    listing = {'complete': None}
+    assert [key for key, _ in tool.iter_shard_entries(entries, listing)] == ['a', 'b', 'c']
+    assert listing['complete'] is complete
+
+
+class Worker:
+    def __init__(self, alive=True):
+        self.alive = alive
+
+    def is_alive(self):
+        return self.alive
+
+
+@pytest.fixture
+def inventory(tmp_path):
+    (tmp_path / 'data').mkdir()
+    (tmp_path / 'manifest').mkdir()
+    keys = [f"cases/{n}.svs" for n in range(50)]
+    with gzip.open(tmp_path / 'data' / 'rows.csv.gz', 'wt') as f:
+        f.writelines(f"bkt,{key},100,GLACIER\n" for key in keys)
+    manifest = tmp_path / 'manifest' / 'manifest.json'
+    manifest.write_text(json.dumps({
+        'sourceBucket': 'bkt', 'fileFormat': 'CSV', 'fileSchema': 'Bucket, Key, Size, StorageClass',
+        'files': [{'key': 'data/rows.csv.gz'}],
+    }))
+    return str(manifest), keys
+
+
+def shard_args(manifest):
+    return argparse.Namespace(
+        bucket='bkt', prefix=None, inventory_manifest=manifest, inventory_workers=1, batch_ops=False,
+        shards=SHARDS, profile=None, endpoint_url=None, concurrency=4, max_request_rate=100, max_attempts=3,
+    )
+
+
+def drain(entries):
+    items = []
+    while True:
+        item = entries.get(timeout=10)
+        if isinstance(item, bool):
+            return items, item
+        items.extend(item)
+
+
+def test_feed_shards_streams_each_shard_its_keys(tool, inventory, monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    manifest, keys = inventory
+    monkeypatch.setattr(tool, 'SHARD_BATCH_SIZE', 4)
+    context = multiprocessing.get_context('fork')
+    # Shard 2 resumed with its listing done, so it is not fed
+    queues = [context.Queue(), None, context.Queue()]
+    tool.feed_shards(shard_args(manifest), queues, [Worker()] * SHARDS)
+    for index in (0, 2):
+        items, complete = drain(queues[index])
+        assert complete is True
+        assert sorted(key for key, _ in items) == sorted(k for k in keys if tool.shard_of(k, SHARDS) == index)
+        assert all(listed[0] == 'GLACIER' for _, listed in items)
+
+
+def test_feed_shards_stops_sending_to_an_exited_shard(tool, inventory, monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    manifest, keys = inventory
+    monkeypatch.setattr(tool, 'SHARD_BATCH_SIZE', 1)
+    context = multiprocessing.get_context('fork')
+    # The first shard's queue fills up and nobody reads it
+    queues = [context.Queue(1), context.Queue(), context.Queue()]
+    tool.feed_shards(shard_args(manifest), queues, [Worker(alive=False), Worker(), Worker()])
+    items, complete = drain(queues[1])
+    assert complete is True
+    assert sorted(key for key, _ in items) == sorted(k for k in keys if tool.shard_of(k, SHARDS) == 1)
@@ -0,0 +1,57 @@
+import hashlib
+import os
+
+import pytest
+
+DATA = os.urandom(300 * 1024)
+
+
+class FailingBody:
+    """A response body that breaks off after its first chunk."""
+
+    def iter_chunks(self, chunk_size):
+        yield DATA[:chunk_size]
+        raise ConnectionResetError('connection reset')
+
+
+class FailingS3:
+    def get_object(self, Bucket, Key):
+        return {'Body': FailingBody()}
+
+
+def share_files(root):
+    return sorted(os.path.relpath(os.path.join(d, n), root) for d, _, names in os.walk(root) for n in names)
+
+
+def test_stream_to_share_writes_in_place_and_feeds_the_hasher(tool, s3, tmp_path):
+    s3.put_object(Bucket='bkt', Key='cases/a.svs', Body=DATA)
+    hasher = tool.ETagHasher(len(DATA), hashlib.md5(DATA).hexdigest())
+    path = tool.stream_to_share(s3, 'bkt', 'cases/a.svs', str(tmp_path), chunk_size=64 * 1024, hasher=hasher)
+    assert path == str(tmp_path / 'cases' / 'a.svs')
+    assert (tmp_path / 'cases' / 'a.svs').read_bytes() == DATA
+    assert hasher.matches()
+    assert share_files(tmp_path) == ['cases/a.svs']
+
+
+def test_interrupted_stream_leaves_nothing_on_the_share(tool, tmp_path):
+    with pytest.raises(ConnectionResetError):
+        tool.stream_to_share(FailingS3(), 'bkt', 'cases/a.svs', str(tmp_path), chunk_size=1024)
+    assert share_files(tmp_path) == []
+
+
+def test_transfer_without_download_dir_streams_and_verifies(tool, s3, tmp_path):
+    s3.put_object(Bucket='bkt', Key='cases/a.svs', Body=DATA)
+    hasher = tool.ETagHasher(len(DATA), hashlib.md5(DATA).hexdigest())
+    local, dest, verified = tool.transfer_object(s3, 'bkt', 'cases/a.svs', None, str(tmp_path), None,
+                                                 hasher=hasher, size=len(DATA))
+    assert local is None
+    assert dest == verified == str(tmp_path / 'cases' / 'a.svs')
+
+
+def test_transfer_reports_a_stream_that_fails_verification_as_unverified(tool, s3, tmp_path):
+    s3.put_object(Bucket='bkt', Key='cases/a.svs', Body=DATA)
+    hasher = tool.ETagHasher(len(DATA), hashlib.md5(b'other bytes').hexdigest())
+    _, dest, verified = tool.transfer_object(s3, 'bkt', 'cases/a.svs', None, str(tmp_path), None,
+                                             hasher=hasher, size=len(DATA))
+    assert dest == str(tmp_path / 'cases' / 'a.svs')
+    assert verified is None
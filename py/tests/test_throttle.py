@@ -0,0 +1,84 @@
+import os
+from datetime import datetime
+
+import pytest
+
+MB = 1024 * 1024
+
+
+def test_parse_bandwidth_schedule(tool):
+    assert tool.parse_bandwidth_schedule('07:00-19:00=40, 19:00-07:00=0') == [
+        (7 * 60, 19 * 60, 40 * MB), (19 * 60, 7 * 60, 0.0),
+    ]
+    assert tool.parse_bandwidth_schedule('') == []
+
+
+@pytest.mark.parametrize('spec', ['07:00-19:00', '7am-7pm=40', '07:00-19:00=fast'])
+def test_parse_bandwidth_schedule_rejects_bad_windows(tool, spec):
+    with pytest.raises(ValueError):
+        tool.parse_bandwidth_schedule(spec)
+
+
+@pytest.mark.parametrize('hour, rate', [(12, 40 * MB), (22, 0.0), (3, 0.0), (7, 40 * MB), (19, 0.0)])
+def test_scheduled_rate_picks_the_window_including_ones_past_midnight(tool, hour, rate):
+    schedule = tool.parse_bandwidth_schedule('07:00-19:00=40,19:00-07:00=0')
+    assert tool.scheduled_rate(schedule, 5 * MB, datetime(2024, 1, 1, hour, 0)) == rate
+
+
+def test_scheduled_rate_outside_every_window_is_the_default(tool):
+    schedule = tool.parse_bandwidth_schedule('01:00-02:00=1')
+    assert tool.scheduled_rate(schedule, 5 * MB, datetime(2024, 1, 1, 12, 0)) == 5 * MB
+
+
+@pytest.fixture
+def clock(tool, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(tool.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_reserve_meters_bytes_at_the_rate(tool, clock):
+    throttle = tool.TransferThrottle('download', 4, rate=1000)
+    assert throttle.reserve(500) == 0.5
+    clock[0] += 0.5
+    assert throttle.reserve(500) == 0.5
+    # Idle time banks at most one second of tokens
+    clock[0] += 10
+    assert throttle.reserve(1000) == 0.0
+    assert throttle.reserve(250) == 0.25
+
+
+def test_unlimited_throttle_never_waits(tool):
+    assert tool.TransferThrottle('download', 4).reserve(10 * MB) == 0.0
+
+
+def test_adjust_halves_workers_under_load_and_grows_back(tool, monkeypatch):
+    load = [9.0]
+    monkeypatch.setattr(tool.os, 'getloadavg', lambda: (load[0], 0, 0))
+    throttle = tool.TransferThrottle('copy', 8, max_load=4)
+    throttle.adjust()
+    assert throttle.limit == 4
+    throttle.adjust()
+    throttle.adjust()
+    throttle.adjust()
+    assert throttle.limit == 1
+    load[0] = 1.0
+    throttle.adjust()
+    assert throttle.limit == 2
+
+
+def test_download_is_metered_chunk_by_chunk(tool, s3, tmp_path):
+    data = os.urandom(12 * MB)
+    s3.put_object(Bucket='bkt', Key='big.svs', Body=data)
+
+    class Meter:
+        def __init__(self):
+            self.charges = []
+
+        def consume(self, nbytes):
+            self.charges.append(nbytes)
+
+    meter = Meter()
+    tool.download_file(s3, 'bkt', 'big.svs', str(tmp_path), tool.create_transfer_config(5, 5, 2), throttle=meter)
+    assert sum(meter.charges) == len(data)
+    assert len(meter.charges) > 1
@@ -0,0 +1,35 @@
+import os
+from datetime import datetime, timezone
+
+MB = 1024 * 1024
+
+
+def put(s3, key, data):
+    s3.put_object(Bucket='bkt', Key=key, Body=data)
+    return data
+
+
+def test_create_transfer_config(tool):
+    config = tool.create_transfer_config(16, 64, 8)
+    assert (config.multipart_chunksize, config.multipart_threshold) == (16 * MB, 64 * MB)
+    assert config.max_concurrency == 8 and config.use_threads
+    assert not tool.create_transfer_config(16, 64, 1).use_threads
+
+
+def test_schedule_downloads_puts_large_objects_first(tool):
+    sizes = {'small': 10, 'large': 5000, 'medium': 300}
+    assert tool.schedule_downloads(['small', 'unknown', 'large', 'medium'], sizes) == \
+        ['large', 'medium', 'small', 'unknown']
+
+
+def test_multipart_download_preserves_the_key_path(tool, s3, tmp_path):
+    data = put(s3, 'cases/2021/slide.svs', os.urandom(12 * MB + 123))
+    config = tool.create_transfer_config(5, 5, 4)
+    modified = datetime(2021, 3, 4, 5, 6, 7, tzinfo=timezone.utc)
+    local, dest, verified = tool.transfer_object(s3, 'bkt', 'cases/2021/slide.svs', str(tmp_path), None, config,
+                                                 meta=('etag', modified), size=len(data))
+    assert local == str(tmp_path / 'cases' / '2021' / 'slide.svs')
+    assert (dest, verified) == (None, None)
+    with open(local, 'rb') as f:
+        assert f.read() == data
+    assert os.stat(local).st_mtime == modified.timestamp()
@@ -0,0 +1,108 @@
+import base64
+import hashlib
+import os
+
+import pytest
+
+DATA = b'restored bytes' * 100
+MD5 = hashlib.md5(DATA).hexdigest()
+SHA256 = base64.b64encode(hashlib.sha256(DATA).digest()).decode()
+KMS_ETAG = 'a' * 32  # looks like an MD5 but is not one of the content
+
+
+class FakeS3:
+    def __init__(self, head):
+        self.head = head
+        self.calls = 0
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self.calls += 1
+        return {'ContentLength': len(DATA), **self.head}
+
+
+@pytest.mark.parametrize('head, expected', [
+    ({'ETag': f'"{MD5}"'}, True),
+    ({'ETag': f'"{MD5}-12"'}, True),
+    ({'ETag': f'"{MD5}"', 'ServerSideEncryption': 'AES256'}, True),
+    ({'ETag': f'"{KMS_ETAG}"', 'ServerSideEncryption': 'aws:kms'}, False),
+    ({'ETag': f'"{KMS_ETAG}"', 'ServerSideEncryption': 'aws:kms:dsse'}, False),
+    ({'ETag': f'"{KMS_ETAG}"', 'SSECustomerAlgorithm': 'AES256'}, False),
+    ({'ETag': '"not-an-md5"'}, False),
+    ({}, False),
+])
+def test_etag_is_md5(tool, head, expected):
+    assert tool.etag_is_md5(head) is expected
+
+
+@pytest.fixture
+def restored(tmp_path):
+    path = tmp_path / 'object.bin'
+    path.write_bytes(DATA)
+    return str(path)
+
+
+def verify(tool, s3, path, etag):
+    results = tool.verify_files(s3, 'bucket', [('key', path)], {'key': len(DATA)}, {'key': (etag, None)}, 1)
+    return results[('key', path)]
+
+
+def test_matching_etag_needs_no_head(tool, restored):
+    s3 = FakeS3({})
+    assert verify(tool, s3, restored, MD5) == 'ok'
+    assert s3.calls == 0
+
+
+def test_kms_object_without_checksum_is_unverifiable(tool, restored):
+    s3 = FakeS3({'ETag': f'"{KMS_ETAG}"', 'ServerSideEncryption': 'aws:kms'})
+    assert verify(tool, s3, restored, KMS_ETAG) == 'unverifiable'
+
+
+def test_kms_object_with_checksum_is_verified(tool, restored):
+    s3 = FakeS3({'ETag': f'"{KMS_ETAG}"', 'ServerSideEncryption': 'aws:kms', 'ChecksumSHA256': SHA256})
+    assert verify(tool, s3, restored, KMS_ETAG) == 'ok'
+
+
+def test_plain_object_with_wrong_bytes_is_mismatch(tool, restored):
+    s3 = FakeS3({'ETag': f'"{KMS_ETAG}"'})
+    assert verify(tool, s3, restored, KMS_ETAG) == 'mismatch'
+
+
+def completed_part(tool, tmp_path, etag):
+    dest = tmp_path / 'object.bin'
+    checkpoint = tool.DownloadCheckpoint(str(tool.part_path_for(dest)), len(DATA), etag, len(DATA))
+    fd, _ = tool.open_part_file(checkpoint, len(DATA))
+    os.pwrite(fd, DATA, 0)
+    os.close(fd)
+    checkpoint.mark(0)
+    return dest, checkpoint
+
+
+def test_finished_part_file_is_moved_into_place(tool, tmp_path):
+    dest, checkpoint = completed_part(tool, tmp_path, MD5)
+    head = FakeS3({})
+    head_object = lambda: head.head_object(Bucket='bucket', Key='key')
+    assert tool.finish_part_file('key', checkpoint, dest, len(DATA), (MD5, None), head_object) is True
+    assert dest.read_bytes() == DATA
+    assert head.calls == 0
+    assert not os.path.exists(checkpoint.path)
+
+
+def test_kms_part_file_is_kept_as_unverifiable(tool, tmp_path):
+    dest, checkpoint = completed_part(tool, tmp_path, KMS_ETAG)
+    head = FakeS3({'ETag': f'"{KMS_ETAG}"', 'ServerSideEncryption': 'aws:kms'})
+    head_object = lambda: head.head_object(Bucket='bucket', Key='key')
+    assert tool.finish_part_file('key', checkpoint, dest, len(DATA), (KMS_ETAG, None), head_object) is False
+    assert dest.read_bytes() == DATA
+
+
+def test_mismatched_part_file_is_kept(tool, tmp_path):
+    dest, checkpoint = completed_part(tool, tmp_path, KMS_ETAG)
+    head = FakeS3({'ETag': f'"{KMS_ETAG}"'})
+    head_object = lambda: head.head_object(Bucket='bucket', Key='key')
+    with pytest.raises(tool.IntegrityError):
+        tool.finish_part_file('key', checkpoint, dest, len(DATA), (KMS_ETAG, None), head_object)
+    assert not dest.exists()
+    with open(checkpoint.part_path, 'rb') as f:
+        assert f.read() == DATA
+    # A retry re-checks the kept file instead of downloading it again
+    assert checkpoint.load() and not checkpoint.pending()